@@ -302,19 +302,12 @@ class HighLevelControlTab(QWidget):
 
         if name == "LTS":
             import lts
-            samps = lts.genLTS()
+            samps = lts.genLTSTxRam() #cached, and already packed for TX RAM
 
         #TODO others
 
-        def cfloat2uint32(arr):
-            import numpy as np
-            arr_i = (np.real(arr) * 32767).astype(np.uint16)
-            arr_q = (np.imag(arr) * 32767).astype(np.uint16)
-            return np.bitwise_or(arr_q ,np.left_shift(arr_i.astype(np.uint32), 16))
-
-        samps = cfloat2uint32(samps)
-        self._iris.writeRegisters('TX_RAM_A', 0, cfloat2uint32(samps).tolist())
-        self._iris.writeRegisters('TX_RAM_B', 0, cfloat2uint32(samps).tolist())
+        self._iris.writeRegisters('TX_RAM_A', 0, samps.tolist())
+        self._iris.writeRegisters('TX_RAM_B', 0, samps.tolist())
         self._iris.writeSetting("TX_REPLAY", str(len(samps)))
 
     def loadChannelSettings(self, parent, direction, ch):
@@ -358,6 +358,10 @@ class QT_GUI:
 			packet_start = lts_start - 32 + leadtime*2 #(sps-fft_len)
 			packet_start = 0 if packet_start < 0 else packet_start
 			#print((lts_start,ltss))
+			#correlate (and estimate the channel of) every antenna in one batched pass
+			packets = np.array([s[packet_start-leadtime*2:packet_start+self.num_samps-leadtime] for s in samps[:self.num_plots]])
+			corrs = lts.correlate(packets)[:, 63:packets.shape[1]]/10 #the 'valid' part, as np.correlate
+			if self.ShowConst: chan_ests = 1/lts.getChanEst(packets[:, leadtime+16+delay:leadtime+16+delay+fft_len*2])
 
 		for plt in range(self.num_plots):
 			#if we're in LTSMode we align the samples by detecting the LTS
@@ -378,8 +382,8 @@ class QT_GUI:
 
 				else:
 					
-					packet_samps = samps[plt][packet_start-leadtime*2:packet_start+self.num_samps-leadtime]
-					corr1 = np.correlate(packet_samps,lts.genLTS()[32:64+32])/10
+					packet_samps = packets[plt]
+					corr1 = corrs[plt]
 					corr2 = corr1[:-64]*corr1[64:]
 					packet_samps = packet_samps[leadtime:] #realign correlation
 					self.Corr_plots[plt].setData(np.abs(corr2))
@@ -392,7 +396,7 @@ class QT_GUI:
 					syms_freq = np.fft.fftshift(np.fft.fft(syms[2:,delay:delay+fft_len],axis=1),axes=(1))
 					sl = list(range(6,32))+list(range(33,59))
 					#chan_est = 1/(np.mean(syms_freq[:2,:],axis=0)*lts.lts_freq)[sl]
-					chan_est = 1/(np.mean(np.fft.fftshift(np.fft.fft(np.reshape(packet_samps[16+delay:16+delay+fft_len*2], (2,fft_len) ),axis=1),axes=(1)),axis=0)*lts.lts_freq)
+					chan_est = chan_ests[plt]
 					chan_est = chan_est[sl]
 					syms_freq = syms_freq[:,sl]
 					syms_freq_eq = syms_freq*chan_est
@@ -0,0 +1,309 @@
+#!/usr/bin/python
+#
+#	Record and replay SoapySDR streams, e.g., to rerun DSP on captured data offline.
+#
+#	Wrap a device (SoapySDR or SoapySDRVirt) in a Recorder, and every readStream/writeStream buffer is logged,
+#	with its return value, flags and timestamp, to a capture file.  Setting calls (setSampleRate, writeSetting, ...)
+#	are logged too.  A ReplayDevice then plays the capture back as a virtual device, at full speed or paced
+#	like the original run:
+#		sdr = SoapyCapture.Recorder(SoapySDR.Device(dict(driver="iris", serial="RF3E000001")), "run.cap")
+#		... use sdr as usual, then sdr.close()
+#
+#		sdr = SoapyCapture.ReplayDevice("run.cap", realtime=True)
+#		rxStream = sdr.setupStream(SOAPY_SDR_RX, SOAPY_SDR_CF32, [0, 1])  #the first RX stream of the capture
+#
+#	or get the samples straight from the file:  SoapyCapture.Capture("run.cap").samples(stream=0)
+#
+#	The file is a list of records (a fixed header, then the payload), and it is written through a memory map
+#	that grows as needed, so logging a buffer is a copy into the page cache rather than a write call.
+#	Reading memory maps it too, so the samples are views of the file.
+#	Several Recorders can share a CaptureFile (e.g., every device of a MIMO run), then pick one with ReplayDevice(..., device=n).
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#	INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#	PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+#	FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#	OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#	DEALINGS IN THE SOFTWARE.
+#
+#	(c) 2026 info@skylarkwireless.com
+
+import json
+import mmap
+import threading
+import time
+import numpy as np
+import SoapySDRVirt
+from SoapySDRVirt import * #constants, so this module can be imported as SoapySDR
+from SoapySDRVirt import _FORMAT_BYTES
+
+MAGIC = b'SKLKCAP1'
+KINDS = ['device', 'stream', 'call', 'read', 'write'] #what a record holds: JSON for the first three, buffers for reads and writes
+RECORD = np.dtype([('kind', '<i4'), ('stream', '<i4'), #device number for 'device' and 'call'
+                   ('ret', '<i4'), ('flags', '<i4'), ('time_ns', '<i8'), ('wall', '<f8'), #wall clock time of the call
+                   ('num_chans', '<i4'), ('elem_bytes', '<i4'), ('nbytes', '<i8')]) #payload size, which is padded to 8 bytes
+
+def _json(obj):
+    return json.dumps(obj, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o)).encode()
+
+class CaptureFile:
+    '''Append only capture file, written through a memory map.'''
+
+    def __init__(self, path, chunk=1 << 24):
+        self.path = path
+        self.f = open(path, 'w+b')
+        self.chunk = chunk
+        self.size = 0 #bytes used
+        self.mm = None
+        self.buf = None #np.uint8 view of mm
+        self.lock = threading.Lock()
+        self.num_devices = 0
+        self.num_streams = 0
+        self._reserve(len(MAGIC))
+        self.buf[:len(MAGIC)] = np.frombuffer(MAGIC, dtype=np.uint8)
+        self.size = len(MAGIC)
+
+    def _reserve(self, nbytes):
+        '''Make sure nbytes more fit in the map, growing the file (by doubling) if not.'''
+        if self.mm is not None and self.size + nbytes <= len(self.mm): return
+        capacity = len(self.mm) if self.mm is not None else self.chunk
+        while capacity < self.size + nbytes: capacity *= 2
+        self._unmap()
+        self.f.truncate(capacity)
+        self.mm = mmap.mmap(self.f.fileno(), capacity)
+        self.buf = np.frombuffer(self.mm, dtype=np.uint8)
+
+    def _unmap(self):
+        self.buf = None #the view has to go before the map can be closed
+        if self.mm is not None: self.mm.close()
+        self.mm = None
+
+    def append(self, kind, stream=0, ret=0, flags=0, timeNs=0, payload=(), elem_bytes=0):
+        '''Add a record.  payload is bytes (JSON), or a list of per channel buffers, of which the first ret*elem_bytes bytes are logged.'''
+        if isinstance(payload, bytes):
+            payload = [np.frombuffer(payload, dtype=np.uint8)]
+            chan_bytes = len(payload[0])
+        else:
+            payload = [b.view(np.uint8).reshape(-1) for b in payload]
+            chan_bytes = max(ret, 0)*elem_bytes
+        nbytes = chan_bytes*len(payload)
+        with self.lock:
+            self._reserve(RECORD.itemsize + nbytes + 8)
+            self.buf[self.size:self.size + RECORD.itemsize].view(RECORD)[0] = (KINDS.index(kind), stream, ret, flags, timeNs, time.time(), len(payload), elem_bytes, nbytes)
+            pos = self.size + RECORD.itemsize
+            for p in payload:
+                self.buf[pos:pos + chan_bytes] = p[:chan_bytes]
+                pos += chan_bytes
+            self.size = pos + (-pos % 8)
+
+    def add_device(self, info):
+        '''Log a new device (e.g., its hardware info) and return its number.'''
+        with self.lock:
+            n = self.num_devices
+            self.num_devices += 1
+        self.append('device', n, payload=_json(info))
+        return n
+
+    def add_stream(self, device, direction, fmt, channels, args):
+        '''Log a new stream and return its number.'''
+        with self.lock:
+            n = self.num_streams
+            self.num_streams += 1
+        self.append('stream', n, payload=_json(dict(device=device, direction=direction, format=fmt, channels=list(channels), args=args)))
+        return n
+
+    def close(self):
+        with self.lock:
+            if self.f.closed: return
+            if self.mm is not None: self.mm.flush()
+            self._unmap()
+            self.f.truncate(self.size)
+            self.f.close()
+
+class Recorder:
+    '''
+    Transparent wrapper of a SoapySDR(Virt).Device that logs every stream buffer, and setting, to a capture file.
+    capture is a path, or a CaptureFile shared with other Recorders.  Everything else is passed through to the device.
+    '''
+    _LOGGED = ('set', 'write') #prefixes of the calls logged, e.g., setSampleRate and writeSetting (but not writeStream)
+
+    def __init__(self, device, capture):
+        self.device = device
+        self._own = not isinstance(capture, CaptureFile)
+        self.capture = CaptureFile(capture) if self._own else capture
+        try: info = dict(device.getHardwareInfo())
+        except Exception: info = {}
+        self.number = self.capture.add_device(info)
+        self._streams = {} #id(stream) -> (stream number, bytes per element, the stream, so the id isn't reused)
+
+    def __getattr__(self, name):
+        attr = getattr(self.device, name)
+        if not name.startswith(self._LOGGED) or not callable(attr): return attr
+        def logged(*argv, **kwargs):
+            self.capture.append('call', self.number, payload=_json(dict(name=name, args=argv, kwargs=kwargs)))
+            return attr(*argv, **kwargs)
+        return logged
+
+    def setupStream(self, direction, fmt, channels, kwargs={}):
+        if fmt not in _FORMAT_BYTES: raise ValueError("Can't capture stream format " + str(fmt))
+        stream = self.device.setupStream(direction, fmt, channels, kwargs)
+        self._streams[id(stream)] = (self.capture.add_stream(self.number, direction, fmt, channels, dict(kwargs)), _FORMAT_BYTES[fmt], stream)
+        return stream
+
+    def readStream(self, stream, buffs, numElems, flags=0, timeoutUs=int(1e6)):
+        sr = self.device.readStream(stream, buffs, numElems, flags, timeoutUs=timeoutUs) #SoapySDR's readStream has no timeNs
+        n, elem_bytes, s = self._streams[id(stream)]
+        self.capture.append('read', n, sr.ret, sr.flags, sr.timeNs, buffs, elem_bytes)
+        return sr
+
+    def writeStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        sr = self.device.writeStream(stream, buffs, numElems, flags, timeNs, timeoutUs)
+        n, elem_bytes, s = self._streams[id(stream)]
+        self.capture.append('write', n, sr.ret, flags, timeNs, buffs, elem_bytes) #what was asked for, and how much went out
+        return sr
+
+    def close(self):
+        if self._own: self.capture.close()
+        if hasattr(self.device, 'close'): self.device.close()
+
+class Capture:
+    '''A capture file, memory mapped for reading.  headers has a RECORD for every record, and offsets where their payloads start.'''
+
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(MAGIC)]) != MAGIC: raise ValueError(path + " isn't a capture file")
+        headers, offsets = [], []
+        pos = len(MAGIC)
+        while pos + RECORD.itemsize <= len(self.data): #only the headers are read
+            h = self.data[pos:pos + RECORD.itemsize].view(RECORD)[0]
+            if h['wall'] == 0: break #the unused end of a file that wasn't closed
+            headers.append(h)
+            offsets.append(pos + RECORD.itemsize)
+            pos += RECORD.itemsize + int(h['nbytes']) + (-int(h['nbytes']) % 8)
+        self.headers = np.array(headers, dtype=RECORD)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.devices = [self.json(i) for i in self.index('device')]
+        self.streams = [self.json(i) for i in self.index('stream')]
+
+    def index(self, kind, stream=None):
+        '''Record numbers of a kind (and stream, or device for 'call'), in order.'''
+        match = self.headers['kind'] == KINDS.index(kind)
+        if stream is not None: match &= self.headers['stream'] == stream
+        return np.flatnonzero(match)
+
+    def json(self, i):
+        return json.loads(bytes(self.payload(i)[0]))
+
+    def payload(self, i):
+        '''Per channel views (np.uint8) of the payload of record i.'''
+        h = self.headers[i]
+        chan_bytes = h['nbytes']//max(h['num_chans'], 1)
+        return [self.data[self.offsets[i] + c*chan_bytes:self.offsets[i] + (c + 1)*chan_bytes] for c in range(h['num_chans'])]
+    
+    def views(self, i):
+        '''Per channel views of the buffers of read or write record i, in the format of its stream.'''
+        dtype = SoapySDRVirt.formatBuffer(self.streams[self.headers[i]['stream']]['format'], 0).dtype
+        return [b.view(dtype) for b in self.payload(i)]
+
+    def calls(self, device=0):
+        '''(name, args) of the settings calls logged for a device, in order.  Keyword arguments follow the positional ones.'''
+        return [(c['name'], c['args'] + list(c.get('kwargs', {}).values())) for c in (self.json(i) for i in self.index('call', device))]
+
+    def buffers(self, stream, kind='read'):
+        '''Yield (StreamReturn, per channel views in the stream format) of every read (or write) of a stream.'''
+        for i in self.index(kind, stream):
+            h = self.headers[i]
+            yield StreamReturn(int(h['ret']), int(h['flags']), int(h['time_ns'])), self.views(i)
+
+    def samples(self, stream=0, kind='read'):
+        '''All the samples read (or written) on a stream, as complex64 (channels x samples).'''
+        fmt = self.streams[stream]['format']
+        chunks = [[dequantize(b, sr.ret, fmt) for b in buffs] for sr,buffs in self.buffers(stream, kind) if sr.ret > 0]
+        if not chunks: return np.zeros((len(self.streams[stream]['channels']), 0), dtype=np.complex64)
+        return np.concatenate([np.stack(c) for c in chunks], axis=1).astype(np.complex64)
+
+class _ReplayStream:
+    def __init__(self, records, fmt):
+        self.records = records #record numbers of the reads (or writes) to replay
+        self.fmt = fmt #the format the caller asked for
+        self.next = 0 #next record
+        self.pos = 0 #elements of it already returned
+
+class ReplayDevice:
+    '''
+    Plays a capture back as a device: the n-th stream set up in a direction gets the n-th stream of the capture
+    in that direction (of the device number given), and readStream returns the captured buffers (and errors), in order,
+    then SOAPY_SDR_TIMEOUT at the end.  Writes are accepted and dropped.
+    With realtime, every read waits until as long after the first as it was in the capture.
+    Getters return what was last set in the capture, other calls do nothing.
+    '''
+
+    def __init__(self, path, device=0, realtime=False):
+        self.capture = path if isinstance(path, Capture) else Capture(path)
+        self.number = device
+        self.realtime = realtime
+        self.hw_info = self.capture.devices[device]
+        self._settings = {}
+        for name,args in self.capture.calls(device): self._settings[(name, tuple(args[:-1]))] = args[-1] #e.g., ('setSampleRate', (SOAPY_SDR_RX, 0)) -> rate
+        self._used = set() #capture streams already set up
+        self._start = None #(wall clock time now, in the capture) of the first replayed read
+
+    def __getattr__(self, name):
+        return lambda *argv, **kwargs: None #not in the capture
+
+    def _setting(self, name, *argv):
+        return self._settings.get((name, argv))
+
+    def getHardwareInfo(self):
+        return self.hw_info
+    def getSampleRate(self, direction, channel):
+        return self._setting('setSampleRate', direction, channel)
+    def getFrequency(self, direction, channel, name='RF'):
+        return self._setting('setFrequency', direction, channel, name) or self._setting('setFrequency', direction, channel)
+    def getGain(self, direction, channel, *argv):
+        return self._setting('setGain', direction, channel, *argv)
+    def readSetting(self, *argv):
+        return self._setting('writeSetting', *argv) or ""
+
+    def setupStream(self, direction, fmt, channels, kwargs={}):
+        for n,s in enumerate(self.capture.streams):
+            if s['device'] == self.number and s['direction'] == direction and n not in self._used:
+                self._used.add(n)
+                return _ReplayStream(self.capture.index('read' if direction == SOAPY_SDR_RX else 'write', n), fmt)
+        raise ValueError("No more %s streams in the capture" % ('RX' if direction == SOAPY_SDR_RX else 'TX'))
+    def activateStream(self, stream, flags=0, timeNs=0, numElems=0):
+        return 0
+    def deactivateStream(self, stream, flags=0, timeNs=0):
+        return 0
+    def closeStream(self, stream):
+        return
+
+    def writeStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        return StreamReturn(numElems, flags, timeNs)
+
+    def readStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        if stream.next >= len(stream.records): return StreamReturn(SOAPY_SDR_TIMEOUT)
+        i = stream.records[stream.next]
+        h = self.capture.headers[i]
+        if self.realtime:
+            if self._start is None: self._start = (time.time(), h['wall'])
+            wait = h['wall'] - self._start[1] - (time.time() - self._start[0])
+            if wait > 0: time.sleep(wait)
+        if h['ret'] <= 0: #replay the error (or timeout) too
+            stream.next += 1
+            return StreamReturn(int(h['ret']), int(h['flags']), int(h['time_ns']))
+        fmt = self.capture.streams[h['stream']]['format']
+        num = min(numElems, h['ret'] - stream.pos)
+        for buff,b in zip(buffs, self.capture.views(i)):
+            samps = dequantize(b, h['ret'], fmt)[stream.pos:stream.pos + num]
+            quantize(samps, buff, stream.fmt) #converts, if the format isn't the captured one
+        rate = self.getSampleRate(SOAPY_SDR_RX, 0)
+        time_ns = int(h['time_ns'] + (SoapySDRVirt.ticksToTimeNs(stream.pos, rate) if rate else 0))
+        stream.pos += num
+        ret_flags = int(h['flags'])
+        if stream.pos == h['ret']: stream.next, stream.pos = stream.next + 1, 0
+        else: ret_flags &= ~SOAPY_SDR_END_BURST #the rest of the buffer is still to come
+        return StreamReturn(num, ret_flags, time_ns)
+
+    def close(self):
+        return
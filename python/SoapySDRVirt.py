@@ -4,14 +4,26 @@
 #   This is an initial version and needs improvement.
 #   It can only really be used to quickly test SoapySDR code.
 #
-#   It is lacking any sort of timestamp or streaming ability, or any notion of sample rate.  
+#   TX and RX streams are placed on a shared emulated sample clock (set by setSampleRate), and
+#   timeNs/SOAPY_SDR_HAS_TIME are honored, so timed bursts and continuous streaming loops line up.
+#   Every radio has its own hardware time on that clock, and they are all on one trigger chain (TRIGGER_GEN, 
+#   SOAPY_SDR_WAIT_TRIGGER, setHardwareTime(t, "TRIGGER"), and SYNC_DELAYS), so trigger based code runs too.
+#   Samples are quantized like a 12 bit converter, and CF32, CS16, and CS12 stream formats are supported.
+#   RX_SNOOPER, TX_RAM_A/B with TX_REPLAY, and the temperature sensors are modeled, other registers and settings are just stored.
 #   It could probably be done much more effectively at a lower layer, e.g., a SoapyRemote 
 #   device attached to a channel emulator.
+#   SoapyVirtRemote.py serves these devices over TCP/UDP, for testing network streaming.
+#   ChanEmu().save_scenario("file.npz") saves the radios, their channels (and geometry), and load_scenario() memory maps them back,
+#   so large emulations start fast and get the same channels every run.
+#   ChanEmu(geometry=ArrayGeometry(positions)) gives the radios positions (e.g., ula() or upa() arrays) and spatially 
+#   consistent channels, so beamforming works, and ArrayGeometry also gives the true channels as (... x rx x tx) tensors.
 #
 #
 #
 #   #usage: import SoapySDRVirt as SoapySDR
-#   call ChanEmu().reset() to clear the buffers.
+#   call ChanEmu().reset() to clear the buffers (and stop any TX_REPLAY).
+#   To emulate across processes, call ChanEmu().share("name") in one process (before or after creating devices) 
+#   and ChanEmu().attach("name") in the others, before creating their devices.
 #
 #	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
 #	INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
@@ -23,6 +35,20 @@
 #	(c) 2020 info@skylarkwireless.com 
 
 import numpy as np
+import json
+import os
+import tempfile
+import time
+import copy
+import threading
+import collections
+import zipfile
+import functools
+import math
+from contextlib import ExitStack
+from multiprocessing import shared_memory, resource_tracker, parent_process
+try: import fcntl
+except ImportError: fcntl = None #only needed for shared (multi-process) emulation
 
 #these are included just to avoid errors.
 #Constants
@@ -35,6 +61,15 @@ SOAPY_SDR_ONE_PACKET = (1 << 4)
 SOAPY_SDR_MORE_FRAGMENTS = (1 << 5)
 SOAPY_SDR_WAIT_TRIGGER = (1 << 6)
 
+#error codes
+SOAPY_SDR_TIMEOUT = -1
+SOAPY_SDR_STREAM_ERROR = -2
+SOAPY_SDR_CORRUPTION = -3
+SOAPY_SDR_OVERFLOW = -4
+SOAPY_SDR_NOT_SUPPORTED = -5
+SOAPY_SDR_TIME_ERROR = -6
+SOAPY_SDR_UNDERFLOW = -7
+
 #data types
 SOAPY_SDR_CF64 = "CF64" 
 SOAPY_SDR_CF32 = "CF32" 
@@ -64,21 +99,222 @@ def timeNsToTicks(timeNs, rate):
     return timeNs*rate/1e9
 
 def clip(a, m=1, nbits=12):
-    np.clip(a.real, -m, m, out=a.real)
-    np.clip(a.imag, -m, m, out=a.imag)
-    if nbits is not None:
-        #quick way to simulate limited bit precision (and make rx gain important)
-        a.real[np.argwhere(np.abs(a.real) < 1/2**(nbits-1))] = 0 #highest bit is sign
-        a.imag[np.argwhere(np.abs(a.imag) < 1/2**(nbits-1))] = 0
+    '''Clip a (in place) to +/-m, and round it to the grid of an nbits two's complement converter (full scale is 1).'''
+    lsb = 0 if nbits is None else 1/2**(nbits-1) #highest bit is sign
+    for part in (a.real, a.imag):
+        np.clip(part, -m, min(m, 1-lsb), out=part)
+        if nbits is not None:
+            #simulate limited bit precision (and make rx gain important)
+            part *= 2**(nbits-1)
+            np.rint(part, out=part)
+            part *= lsb
     return a
 
+#fixed point stream formats: CS16 is a pair of int16 per sample (the 12 bit samples are left justified),
+#and CS12 packs a pair of 12 bit integers into 3 bytes.  Buffers can be any dtype with the right number of bytes,
+#e.g., np.int16 (2 per sample) or np.uint32 (1 per sample, I in the low 16 bits) for CS16, and np.uint8 for CS12.
+_FORMAT_BYTES = {SOAPY_SDR_CF64 : 16, SOAPY_SDR_CF32 : 8, SOAPY_SDR_CS16 : 4, SOAPY_SDR_CS12 : 3}
+
+def formatBuffer(fmt, num):
+    '''Buffer for num elements of a stream format, as quantize() and dequantize() expect.'''
+    if fmt == SOAPY_SDR_CF64: return np.zeros(num, dtype=np.complex128)
+    if fmt == SOAPY_SDR_CF32: return np.zeros(num, dtype=np.complex64)
+    if fmt == SOAPY_SDR_CS16: return np.zeros(2*num, dtype=np.int16)
+    return np.zeros(_FORMAT_BYTES[fmt]*num, dtype=np.uint8)
+
+def quantize(samps, out, fmt=SOAPY_SDR_CS16):
+    '''Write complex samples (already clipped to the converter grid) into a fixed point buffer, in place.'''
+    n = samps.shape[0]
+    iq = np.ascontiguousarray(samps, dtype=np.complex64).view(np.float32)
+    if fmt == SOAPY_SDR_CS16:
+        np.multiply(iq, 2**15, out=out.view(np.int16).reshape(-1)[:2*n], casting='unsafe') #exact, since samps are on the grid
+    elif fmt == SOAPY_SDR_CS12:
+        v = (iq*2**11).astype(np.int16).view(np.uint16).reshape(n, 2) & 0xfff
+        b = out.view(np.uint8).reshape(-1)[:3*n].reshape(n, 3)
+        b[:,0] = v[:,0] & 0xff
+        b[:,1] = (v[:,0] >> 8) | ((v[:,1] & 0xf) << 4)
+        b[:,2] = v[:,1] >> 4
+    else:
+        out[:n] = samps
+    return out
+
+def dequantize(buff, num, fmt=SOAPY_SDR_CS16):
+    '''Read num complex64 samples from a (possibly fixed point) buffer.'''
+    if fmt == SOAPY_SDR_CS16:
+        return buff.view(np.int16).reshape(-1)[:2*num].astype(np.float32).view(np.complex64)/np.float32(2**15)
+    if fmt == SOAPY_SDR_CS12:
+        b = buff.view(np.uint8).reshape(-1)[:3*num].reshape(num, 3).astype(np.uint16)
+        v = np.empty((num, 2), dtype=np.uint16)
+        v[:,0] = b[:,0] | ((b[:,1] & 0xf) << 8)
+        v[:,1] = (b[:,1] >> 4) | (b[:,2] << 4)
+        v = (v << 4).view(np.int16) >> 4 #sign extend
+        return v.astype(np.float32).view(np.complex64).reshape(-1)/np.float32(2**11)
+    return buff[:num]
+
+def loadNpz(path):
+    '''Memory map every array of an (uncompressed) npz file, e.g., from np.savez.  Returns a dict of read only arrays.'''
+    arrays = {}
+    with zipfile.ZipFile(path) as z, open(path, 'rb') as f:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED: raise ValueError("Can't memory map a compressed npz")
+            f.seek(info.header_offset + 26) #the local file header has the name and extra field lengths at 26
+            name_len, extra_len = [int(v) for v in np.frombuffer(f.read(4), dtype='<u2')]
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            shape, fortran, dtype = (np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0)(f)
+            a = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape, order='F' if fortran else 'C') if np.prod(shape) else np.zeros(shape, dtype)
+            arrays[info.filename[:-4]] = a.view(np.ndarray) #still mapped, without the np.memmap overhead on every index
+    return arrays
+
+def _add_periodic(out, period, start):
+    '''Add the periodic signal (repeating period from tick 0) at ticks [start, start+len(out)) to out, along the last axis.'''
+    n = period.shape[-1]
+    i, pos, num = start % n, 0, out.shape[-1]
+    while pos < num:
+        k = min(num - pos, n - i)
+        out[..., pos:pos+k] += period[..., i:i+k]
+        pos, i = pos + k, 0
+    return out
+
+def _ring_get(ring, start, out):
+    '''Copy len(out) samples from a ring buffer, starting at absolute sample index "start".'''
+    n = out.shape[0]
+    i = start % ring.shape[0]
+    k = min(n, ring.shape[0] - i)
+    out[:k] = ring[i:i+k]
+    out[k:] = ring[:n-k]
+    return out
+
+def _ring_put(ring, start, vals):
+    '''Copy vals into a ring buffer, starting at absolute sample index "start".'''
+    n = vals.shape[0]
+    i = start % ring.shape[0]
+    k = min(n, ring.shape[0] - i)
+    ring[i:i+k] = vals[:k]
+    ring[:n-k] = vals[k:]
+
+def _os_blocks(x, nfft, overlap):
+    '''Split the last axis of x into overlap-save blocks of nfft samples, each overlapping the previous by "overlap" (zero padding the end).'''
+    step = nfft - overlap
+    nblocks = -(-(x.shape[-1] - overlap) // step)
+    xp = np.zeros(x.shape[:-1] + (overlap + nblocks*step,), dtype=np.complex64)
+    xp[..., :x.shape[-1]] = x
+    return np.lib.stride_tricks.sliding_window_view(xp, nfft, axis=-1)[..., ::step, :]
+
+class Oscillator:
+    '''
+    Phase-continuous complex oscillator at "cfo" radians per sample, e.g., for the CFO of a channel.
+    It keeps its phase across calls, so consecutive buffers line up, and it can seek to any tick of the sample clock.
+    Samples come from a cached phasor table of one block, rotated by the running phase of every block.
+    The table is built on first use, and shared by oscillators at the same cfo (every channel, by default).
+    '''
+    def __init__(self, cfo, block=4096):
+        self.cfo = cfo
+        self.phase = 0. #radians, at self.tick
+        self.tick = 0
+        self.block = block
+        self._table = None
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _phasors(cfo, block):
+        table = np.exp(np.arange(block)*1.j*cfo).astype(np.complex64)
+        table.flags.writeable = False
+        return table
+        
+    def seek(self, tick):
+        self.phase = np.fmod(self.cfo*tick, 2*np.pi)
+        self.tick = tick
+        
+    def rotate(self, out, tick=None):
+        '''Multiply out (in place) by the next len(out) oscillator samples, starting at tick if given.'''
+        if tick is not None and tick != self.tick: self.seek(tick)
+        if self._table is None: self._table = self._phasors(float(self.cfo), self.block)
+        block = self.block
+        for i in range(0, out.shape[-1], block):
+            seg = out[..., i:i+block]
+            m = seg.shape[-1]
+            seg *= self._table[:m]
+            seg *= np.complex64(np.exp(1.j*self.phase))
+            self.phase = np.fmod(self.phase + self.cfo*m, 2*np.pi)
+        self.tick += out.shape[-1]
+        return out
+
+class Noise:
+    '''
+    Complex64 white Gaussian noise from a np.random.Generator.
+    The normals are drawn as float32 straight into a reusable scratch buffer, which is viewed as complex64 and scaled
+    in place, so adding noise to a buffer doesn't allocate any full-size temporaries.  Every thread has its own scratch buffer.
+    '''
+    def __init__(self, rng=None):
+        self.rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+        self._local = threading.local()
+        
+    def draw(self, shape, std=1):
+        '''Noise of the given shape with std (per real dimension, broadcast over the last axis), in the scratch buffer -- only valid until the next draw.'''
+        size = 2*int(np.prod(shape))
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None or scratch.shape[0] < size: scratch = self._local.scratch = np.empty(size, dtype=np.float32)
+        buf = self.rng.standard_normal(size, dtype=np.float32, out=scratch[:size])
+        z = buf.view(np.complex64).reshape(shape)
+        if np.ndim(std) == 0: z *= np.float32(std)
+        else: z *= np.asarray(std, dtype=np.float32)
+        return z
+    
+    def add(self, out, std=1):
+        '''Add noise to out (complex64) in place.'''
+        out += self.draw(out.shape, std)
+        return out
+
+class Fading:
+    '''
+    Time-varying tap gains of a Rayleigh or Rician fading channel, as a function of the tick of the emulated sample clock.
+    Each tap is a sum of sinusoids (Zheng & Xiao's model) with a maximum Doppler shift of "doppler" cycles per sample,
+    and the first tap can also have a line of sight component ("k_factor" is the Rician K, linear).
+    Gains are evaluated in vectorized blocks on a coarse grid of ticks and linearly interpolated in between.
+    '''
+    def __init__(self, num_taps, doppler, k_factor=0, seed=None, num_sinusoids=16, step=None):
+        rng = np.random.default_rng(seed)
+        m = np.arange(1, num_sinusoids+1)
+        alpha = (2*np.pi*m - np.pi + rng.uniform(-np.pi, np.pi, size=(num_taps,1)))/(4*num_sinusoids) #arrival angles, tap x sinusoid
+        self._wi = 2*np.pi*doppler*np.cos(alpha)
+        self._wq = 2*np.pi*doppler*np.sin(alpha)
+        self._phi = rng.uniform(-np.pi, np.pi, size=alpha.shape)
+        self._psi = rng.uniform(-np.pi, np.pi, size=alpha.shape)
+        self._los_w = 2*np.pi*doppler*np.cos(rng.uniform(-np.pi, np.pi))
+        self._los_phase = rng.uniform(-np.pi, np.pi)
+        self._k = np.zeros((num_taps,1))
+        self._k[0] = k_factor
+        self.step = step if step is not None else int(np.clip(1/(50*doppler), 1, 1024)) if doppler > 0 else 1024 #~50 points per Doppler cycle
+    
+    def gains(self, tick, n):
+        '''Complex gain of every tap (tap x n) for ticks [tick, tick+n).'''
+        first = tick//self.step
+        t = np.arange(first, (tick+n-1)//self.step + 2)*float(self.step) #grid ticks around the block
+        g = np.cos(self._wi[:,:,None]*t + self._phi[:,:,None]).sum(axis=1) + 1j*np.cos(self._wq[:,:,None]*t + self._psi[:,:,None]).sum(axis=1)
+        g /= np.sqrt(self._phi.shape[1]) #unit power
+        g = g*np.sqrt(1/(self._k+1)) + np.exp(1j*(self._los_w*t + self._los_phase))*np.sqrt(self._k/(self._k+1))
+        pos = (np.arange(tick, tick+n) - t[0])/self.step
+        i = pos.astype(int)
+        f = (pos - i).astype(np.float32)
+        return (g[:, i]*(1-f) + g[:, i+1]*f).astype(np.complex64)
+
 class Channel:
     ''' 
     A very basic multipath channel model with some number of taps over a delay spread, each with their own phase and attenuation.
     It implements various impairments including noise, CFO, delay, and DC offset.
     Parameters are static once instantiated.
+    
+    The taps are applied either directly (one slice-add per tap) or, for many taps over long buffers, as an FIR 
+    with overlap-save FFTs; method='auto' picks whichever is cheaper for each buffer.
+    
+    With fading='rayleigh' or 'rician' the taps instead vary over time (see Fading), with a maximum Doppler shift of 
+    "doppler" cycles per sample (e.g., 1e-5 is 100 Hz at 10 Msps).  All random draws come from a np.random.Generator 
+    seeded with "seed", so channels can be reproduced.
     '''
-    def __init__(self, noise=-70, phase_shift=True, attn=-40, attn_var=5, delay=48, delay_var=5, dc=.1, iq_imbal=.1, cfo=.00005, delay_spread=5, num_taps=4, tap_attn=12):
+    _FADING = [None, 'rayleigh', 'rician']
+    
+    def __init__(self, noise=-70, phase_shift=True, attn=-40, attn_var=5, delay=48, delay_var=5, dc=.1, iq_imbal=.1, cfo=.00005, delay_spread=5, num_taps=4, tap_attn=12, method='auto', fading=None, doppler=0, k_factor=0, seed=None):
     #def __init__(self, noise=None, phase_shift=False, attn=-30, attn_var=0, delay=48, delay_var=0, dc=0, iq_imbal=0, cfo=0, delay_spread=1, num_taps=1, tap_attn=4):
         #cfo in phase rotation per sample in radians
         if num_taps < 1:
@@ -90,133 +326,1290 @@ class Channel:
         self.delay = delay 
         self.delay_spread = delay_spread
         self.num_taps = num_taps
-        if delay_var > 0: self.delay += np.random.randint(0,delay_var+1) #weird behavior, where delay_var=1 always returns 0
-        self.dc_rx = 0 if dc == 0 else np.random.normal(scale=dc) + np.random.normal(scale=dc)*1j #randomize dc offset
-        self.dc_tx = 0 if dc == 0 else np.random.normal(scale=dc) + np.random.normal(scale=dc)*1j #randomize dc offset
-        self.iq_imbal_tx = 1 if iq_imbal == 0 else 1 + np.random.normal(scale=iq_imbal) #randomize IQ imbalance
-        self.iq_imbal_rx = 1 if iq_imbal == 0 else 1 + np.random.normal(scale=iq_imbal) #randomize IQ imbalance
+        self.rng = np.random.default_rng(seed)
+        if delay_var > 0: self.delay += int(self.rng.integers(0,delay_var+1)) #weird behavior, where delay_var=1 always returns 0
+        self.dc_rx = 0 if dc == 0 else self.rng.normal(scale=dc) + self.rng.normal(scale=dc)*1j #randomize dc offset
+        self.dc_tx = 0 if dc == 0 else self.rng.normal(scale=dc) + self.rng.normal(scale=dc)*1j #randomize dc offset
+        self.iq_imbal_tx = 1 if iq_imbal == 0 else 1 + self.rng.normal(scale=iq_imbal) #randomize IQ imbalance
+        self.iq_imbal_rx = 1 if iq_imbal == 0 else 1 + self.rng.normal(scale=iq_imbal) #randomize IQ imbalance
         self.noise = noise       
-        self.cfo = cfo
+        self.cfo = cfo #creates the oscillator
         self.paths = []
         self.path_delays = [0]
         self.num_taps=num_taps
         for i in range(num_taps):
-            new_path = 10**((attn + np.random.normal(scale=attn_var))/20)
+            new_path = 10**((attn + self.rng.normal(scale=attn_var))/20)
             if i > 0: new_path /= i*10**(tap_attn/20)  #increasingly attenuate additional paths
-            if phase_shift: new_path *= np.exp(np.random.uniform(high=2*np.pi)*1j)
+            if phase_shift: new_path *= np.exp(self.rng.uniform(high=2*np.pi)*1j)
             self.paths.append(new_path)
-            if i > 0: self.path_delays.append(np.random.randint(low=i,high=delay_spread+1)) #weird behavior, high never happens #could result in two of the same delays -- but that's ok
+            if i > 0: self.path_delays.append(int(self.rng.integers(low=i,high=delay_spread+1))) #weird behavior, high never happens #could result in two of the same delays -- but that's ok
+        if fading not in self._FADING: raise ValueError("fading must be one of %s" % self._FADING)
+        self.fading = fading
+        self.doppler = doppler
+        self.k_factor = k_factor if fading == 'rician' else 0
+        self.fade_seed = int(self.rng.integers(2**62)) #the fading trajectories have their own generator, so they can be rebuilt from params()
+        self._noise = Noise(np.random.default_rng([self.fade_seed, 1])) #and so does the noise
+        self.method = method
+        self._h = None #impulse response, built on first use
+        self._hf = {} #FFTs of the impulse response, by FFT size
+        self._fade = None
             
-    def channelize(self,samps):
-        '''Apply the channel to a buffer of samples.'''
-        out = np.zeros(samps.shape[0]+self.delay+self.delay_spread,dtype=np.complex64)
-        samps_c = np.copy(samps) #create copy so we don't alter original
+    _PARAMS = ['delay', 'delay_spread', 'num_taps', 'cfo', 'noise', 'dc_tx', 'dc_rx', 'iq_imbal_tx', 'iq_imbal_rx', 'paths', 'path_delays', 'fading', 'doppler', 'k_factor', 'fade_seed']
+    
+    def params(self):
+        '''The parameters that define this channel (after randomization), e.g., to store them or rebuild it elsewhere.'''
+        return {k: getattr(self, k) for k in self._PARAMS}
+    
+    @classmethod
+    def from_params(cls, method='auto', seed=None, **params):
+        '''Rebuild a channel from params(), without drawing any of them at random.'''
+        c = cls.__new__(cls)
+        for k in cls._PARAMS: setattr(c, k, params[k])
+        c.paths = list(c.paths)
+        c.path_delays = [int(d) for d in c.path_delays]
+        c.rng = np.random.default_rng(seed)
+        c._noise = Noise(c.rng if seed is not None else np.random.default_rng([c.fade_seed, 1])) #the same noise as the original, unless seeded
+        c.method = method
+        c._h = None
+        c._hf = {}
+        c._fade = None
+        return c
+    
+    @property
+    def time_varying(self):
+        return self.fading is not None
+    
+    def fade_gains(self, tick, n):
+        '''Fading gain of every tap (tap x n) for ticks [tick, tick+n).'''
+        if self._fade is None: self._fade = Fading(self.num_taps, self.doppler, self.k_factor, self.fade_seed)
+        return self._fade.gains(tick, n)
+    
+    @property
+    def cfo(self):
+        return self._osc.cfo
+    
+    @cfo.setter
+    def cfo(self, cfo):
+        self._osc = Oscillator(cfo)
         
-        for i in range(self.num_taps):
-            out[self.delay+self.path_delays[i]:self.delay+self.path_delays[i]+samps.shape[0]] += samps_c*self.paths[i] #apply path phase shift, attenuation, and delay
-        out *= self.genCFO(out.shape[0], self.cfo)  #apply cfo #each device should have a different CFO!
+    @property
+    def max_lag(self):
+        '''Longest delay (in samples) of any path, i.e., how much TX history is needed to produce one RX sample.'''
+        return self.delay + self.delay_spread
+
+    def impulse_response(self):
+        '''The taps as an FIR over [delay, delay+delay_spread], i.e., without the bulk delay.'''
+        if self._h is None:
+            self._h = np.zeros(self.delay_spread+1, dtype=np.complex64)
+            for path,path_delay in zip(self.paths, self.path_delays): self._h[path_delay] += path
+        return self._h
+    
+    def fft_size(self):
+        '''FFT size for overlap-save filtering: a power of two about 4x the impulse response.'''
+        return 1 << int(np.ceil(np.log2(4*(self.delay_spread+1))))
+    
+    def use_fft(self, n):
+        '''True if overlap-save is cheaper than the direct slice-adds for a buffer of n samples.'''
+        if self.time_varying: return False #the taps aren't an FIR anymore
+        if self.method != 'auto': return self.method == 'fft'
+        nfft = self.fft_size()
+        #direct costs num_taps multiply-adds per sample, the FFT path two FFTs and a multiply per (nfft-delay_spread) samples
+        return n >= nfft and self.num_taps*(nfft - self.delay_spread) > nfft*(2*np.log2(nfft) + 1)
+    
+    def _fir_fft(self, samps, hist, n):
+        '''Apply the taps with overlap-save FFTs.'''
+        nfft = self.fft_size()
+        if nfft not in self._hf: self._hf[nfft] = np.fft.fft(self.impulse_response(), nfft).astype(np.complex64)
+        first = hist - self.max_lag #input index of the oldest sample any output needs
+        x = samps[max(first,0):hist-self.delay+n]
+        if first < 0: x = np.concatenate((np.zeros(-first, dtype=np.complex64), x))
+        y = np.fft.ifft(np.fft.fft(_os_blocks(x, nfft, self.delay_spread), axis=-1)*self._hf[nfft], axis=-1)[:, self.delay_spread:]
+        return y.reshape(-1)[:n].astype(np.complex64)
+    
+    def channelize(self, samps, hist=0, tick=None):
+        '''
+        Apply the channel to a buffer of samples.
+        The first "hist" samples are only used as history for the delayed paths, so the output is len(samps)-hist long.
+        The CFO phase (and fading) continues from the previous call, unless the tick of the first output sample is given.
+        '''
+        n = samps.shape[0] - hist
+        if tick is None: tick = self._osc.tick
+        if self.use_fft(n):
+            out = self._fir_fft(samps, hist, n)
+        else:
+            out = np.zeros(n,dtype=np.complex64)
+            fade = self.fade_gains(tick, n) if self.time_varying else None
+            for i in range(self.num_taps):
+                lag = self.delay + self.path_delays[i]
+                start = max(0, lag - hist) #output samples before this have no input on this path
+                if start >= n: continue
+                if fade is None: out[start:] += samps[hist+start-lag:hist+n-lag]*self.paths[i] #apply path phase shift, attenuation, and delay
+                else: out[start:] += samps[hist+start-lag:hist+n-lag]*fade[i,start:]*np.complex64(self.paths[i])
+        self._osc.rotate(out, tick)  #apply cfo #each device should have a different CFO!
         out += self.dc_tx #apply dc #more physically accurate to do it for each path, but end result is just another constant dc offset
         out.real *= self.iq_imbal_tx #apply iq imbalance -- we just do real, but it can be more or less than 1, so result is fine
-        if self.noise is not None:
-            out += np.random.normal(scale=10**(self.noise/20), size=out.shape[0]) + np.random.normal(scale=10**(self.noise/20), size=out.shape[0])*1.j #add noise
-        return out[:samps.shape[0]]
+        if self.noise is not None: self._noise.add(out, 10**(self.noise/20)) #add noise
+        return out
 
     @staticmethod
     def genCFO(nsamps, cfo):
         return np.exp(np.array(np.arange(0,nsamps)).transpose()*1.j*cfo).astype(np.complex64) #*2j*np.pi #cfo is radians per sample
 
+
+def ula(n, spacing=.5, axis=1, origin=(0, 0, 0)):
+    '''Positions (n x 3, in wavelengths) of a uniform linear array along axis (0=x, 1=y, 2=z).'''
+    pos = np.zeros((n, 3))
+    pos[:, axis] = np.arange(n)*spacing
+    return pos + origin
+
+def upa(rows, cols, spacing=.5, origin=(0, 0, 0)):
+    '''Positions (rows*cols x 3, in wavelengths) of a uniform planar array in the y-z plane (facing x, like a wall mounted Faros), row by row.'''
+    pos = np.zeros((rows, cols, 3))
+    pos[:, :, 1] = np.arange(cols)*spacing
+    pos[:, :, 2] = np.arange(rows)[:, None]*spacing
+    return pos.reshape(-1, 3) + origin
+
+def direction(azimuth, elevation=0):
+    '''Unit vectors (... x 3) pointing at azimuth (from x towards y) and elevation (towards z), in radians.'''
+    azimuth, elevation = np.broadcast_arrays(azimuth, elevation)
+    return np.stack((np.cos(elevation)*np.cos(azimuth), np.cos(elevation)*np.sin(azimuth), np.sin(elevation)), axis=-1)
+
+def steering(positions, azimuth, elevation=0):
+    '''
+    Far field steering vectors (... x n) of the antennas at positions (n x 3, in wavelengths) towards every azimuth/elevation,
+    i.e., the phase of a plane wave from (or to) that direction at each antenna, relative to the origin.
+    '''
+    return np.exp(2j*np.pi*(direction(azimuth, elevation) @ np.asarray(positions, dtype=np.float64).T)).astype(np.complex64)
+
+class ArrayGeometry:
+    '''
+    Positions of the radios (by chan_id) and a scattering environment, giving spatially consistent channels between them.
+    Every pair has a line of sight path and one path bouncing off each scatterer.  Each path has the phase and delay of its
+    length, a free space loss (attn dB at ref wavelengths, no more than that closer in), and the scatterer's reflection.
+    So antennas close together see correlated channels, and arrays can beamform (see steering()).
+    
+    Positions are in wavelengths (at freq, Hz), and the scatterers are drawn (reproducibly with seed) in a sphere of radius
+    spread around the radios.  All the responses are computed for whole sets of RX and TX radios at once, as (... x rx x tx) tensors.
+    Pass it to ChanEmu(geometry=...) to use it for the emulated channels.
+    '''
+    def __init__(self, positions, num_scatterers=8, spread=100, scatter_attn=6, los=True, attn=-40, ref=10, freq=3.6e9, seed=None, scatterers=None, reflections=None):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.freq = freq
+        self.attn = attn
+        self.ref = ref
+        self.los = los
+        rng = np.random.default_rng(seed)
+        if scatterers is None:
+            u = rng.normal(size=(num_scatterers, 3))
+            r = spread*rng.uniform(size=(num_scatterers, 1))**(1/3) #uniform in the sphere
+            scatterers = self.positions.mean(axis=0) + r*u/np.linalg.norm(u, axis=1, keepdims=True)
+        self.scatterers = np.asarray(scatterers, dtype=np.float64).reshape(-1, 3)
+        if reflections is None: #rayleigh reflections scatter_attn dB down on average
+            reflections = (rng.normal(size=len(self.scatterers)) + 1j*rng.normal(size=len(self.scatterers)))*np.sqrt(10**(-scatter_attn/10)/2)
+        self.reflections = np.asarray(reflections, dtype=np.complex128)
+        self._rows = {}
+    
+    _PARAMS = ['positions', 'scatterers', 'reflections', 'freq', 'attn', 'ref', 'los']
+    
+    @property
+    def num_radios(self):
+        return len(self.positions)
+    
+    def params(self):
+        '''The parameters that define this geometry (with the scatterers drawn), e.g., to save it.  ArrayGeometry(**params) rebuilds it.'''
+        return {k: getattr(self, k) for k in self._PARAMS}
+    
+    def distance(self, rx, tx):
+        '''Distance between two radios, in wavelengths.'''
+        return float(np.linalg.norm(self.positions[rx] - self.positions[tx]))
+    
+    def _legs(self, rx_ids, tx_ids):
+        '''Length of every path (paths x rx x tx) and the reflection on it.'''
+        rx, tx = self.positions[np.asarray(rx_ids)], self.positions[np.asarray(tx_ids)]
+        to_rx = np.linalg.norm(self.scatterers[:, None] - rx[None], axis=-1) #scatterer, rx
+        from_tx = np.linalg.norm(self.scatterers[:, None] - tx[None], axis=-1) #scatterer, tx
+        lengths = from_tx[:, None, :] + to_rx[:, :, None]
+        gains = np.broadcast_to(self.reflections[:, None, None], lengths.shape)
+        if self.los:
+            lengths = np.concatenate((np.linalg.norm(rx[:, None] - tx[None], axis=-1)[None], lengths))
+            gains = np.concatenate((np.ones((1,) + lengths.shape[1:]), gains))
+        return lengths, gains
+    
+    def paths(self, rx_ids, tx_ids, rate):
+        '''The complex gain and delay (in samples at rate) of every path between rx_ids and tx_ids, as (paths x rx x tx) arrays.'''
+        lengths, gains = self._legs(rx_ids, tx_ids)
+        loss = 10**(self.attn/20)*self.ref/np.maximum(lengths, self.ref)
+        h = gains*loss*np.exp(-2j*np.pi*lengths)
+        return h.astype(np.complex64), lengths*rate/self.freq
+    
+    def angles(self, rx_ids, tx_ids):
+        '''
+        Azimuth and elevation (radians) that every path leaves each TX at and arrives at each RX from, as two (paths x rx x tx x 2) arrays.
+        A path towards (az, el) from a far array has its phase across that array's antennas given by steering(positions, az, el).
+        '''
+        rx, tx = self.positions[np.asarray(rx_ids)], self.positions[np.asarray(tx_ids)]
+        shape = (len(self.scatterers), len(rx), len(tx), 3)
+        depart = np.broadcast_to(self.scatterers[:, None, None] - tx[None, None], shape)
+        arrive = np.broadcast_to(self.scatterers[:, None, None] - rx[None, :, None], shape)
+        if self.los:
+            depart = np.concatenate(((rx[:, None] - tx[None])[None], depart))
+            arrive = np.concatenate(((tx[None] - rx[:, None])[None], arrive))
+        def az_el(v): return np.stack((np.arctan2(v[..., 1], v[..., 0]), np.arctan2(v[..., 2], np.hypot(v[..., 0], v[..., 1]))), axis=-1)
+        return az_el(depart), az_el(arrive)
+    
+    def impulse_response(self, rx_ids, tx_ids, rate):
+        '''The taps (lag x rx x tx) as the emulator applies them, i.e., with every path at its delay rounded to a sample.'''
+        h, delays = self.paths(rx_ids, tx_ids, rate)
+        lags = np.rint(delays).astype(np.int64)
+        taps = np.zeros((int(lags.max(initial=0)) + 1,) + h.shape[1:], dtype=np.complex64)
+        r, t = np.indices(h.shape[1:])
+        for p in range(len(h)): np.add.at(taps, (lags[p], r, t), h[p])
+        return taps
+    
+    def frequency_response(self, rx_ids, tx_ids, rate, nfft=64):
+        '''The channel matrix (nfft x rx x tx) on every FFT bin (in np.fft order), e.g., for OFDM MIMO precoding and combining.'''
+        h, delays = self.paths(rx_ids, tx_ids, rate)
+        f = np.fft.fftfreq(nfft).astype(np.float32)[:, None, None]
+        out = np.zeros((nfft,) + h.shape[1:], dtype=np.complex64)
+        phasor = np.empty_like(out)
+        for p in range(len(h)):
+            phase = (-2*np.pi*f)*delays[p].astype(np.float32)
+            phasor.real, phasor.imag = np.cos(phase), np.sin(phase) #much cheaper than a complex exp
+            out += phasor*h[p]
+        return out
+    
+    def row(self, rx, rate):
+        '''paths() from every radio into rx, cached (the path delays are rounded to samples), e.g., for ChanEmu to make the Channels of a row.'''
+        key = (rx, rate)
+        if key not in self._rows:
+            h, delays = self.paths([rx], np.arange(self.num_radios), rate)
+            self._rows[key] = (h[:, 0], np.rint(delays[:, 0]).astype(np.int64))
+        return self._rows[key]
+        
+        
+class ChannelMatrix:
+    '''
+    Dense form of the channels into each RX radio, used to channelize every TX buffer into many RX radios in one batched pass.
+    Each pair's taps are collapsed into an impulse response, and all pairs are applied at once with overlap-save FFTs,
+    i.e., a (rx x tx) matrix multiply per frequency bin.
+    The per-pair CFO, DC, IQ imbalance, and noise are folded into per-RX terms, which is exact as long as every
+    channel into an RX radio has the same CFO (row(r).uniform_cfo tells you if RX radio r qualifies).
+    Rows are built on first use, and only hold the TX radios that are coupled to that RX.  Time-varying (fading) channels
+    can't be batched, so they are left in row(r).varying for the caller to channelize separately.
+    For concurrent readers, with_rows() adds rows to a copy instead, so a matrix that is in use never changes.
+    Rows are built from arrays of the channel parameters, which can also come straight from tables (table_row), 
+    e.g., a loaded scenario, without making a Channel for every pair.
+    '''
+    class Row:
+        '''The static channels into one RX radio.'''
+        replay = None #(key, response) cached by ChanEmu._replay_response
+    
+    _ROW_PARAMS = ['delay', 'delay_spread', 'num_taps', 'cfo', 'noise', 'dc_tx', 'iq_imbal_tx', 'paths', 'path_delays']
+    
+    def __init__(self, channel, num_radios, nfft=None, seed=None, table_row=None):
+        '''
+        channel(r, t) returns the Channel from TX t to RX r, or None if they aren't coupled.
+        table_row(r), if given, returns the TX radios (coupled to r) it has the channels of, and their _ROW_PARAMS as arrays (tx x ...).
+        '''
+        self.channel = channel
+        self.table_row = table_row
+        self._noise = Noise(seed)
+        self.num_radios = num_radios
+        self._nfft = nfft
+        self.max_lag = -1
+        self.nfft = None
+        self._rows = {}
+        
+    def row(self, r):
+        if r not in self._rows: self._add_row(r)
+        return self._rows[r]
+    
+    def with_rows(self, rx_ids):
+        '''This matrix if it already has the rows of rx_ids, otherwise a copy with them added.'''
+        missing = [r for r in rx_ids if r not in self._rows]
+        if not missing: return self
+        m = copy.copy(self)
+        m._rows = dict(self._rows)
+        for r in missing: m.row(r)
+        for r in rx_ids: m.row(r) #again, in case a longer channel cleared the rows
+        return m
+    
+    def _add_row(self, r):
+        txs, p = self.table_row(r) if self.table_row is not None else ([], None)
+        tabled = set(txs)
+        chans = [(t, self.channel(r, t)) for t in range(self.num_radios) if t != r and t not in tabled] #assume you can't rx your own tx
+        chans = [(t, c) for t,c in chans if c is not None]
+        varying = [(t, c) for t,c in chans if c.time_varying]
+        chans = [(t, c) for t,c in chans if not c.time_varying]
+        if chans: 
+            q = self._row_params([c for t,c in chans])
+            if p is None: p = q
+            else: #pad the taps to the same length, and merge
+                taps = max(p['paths'].shape[1], q['paths'].shape[1])
+                p = {k: np.concatenate([np.pad(v[k], ((0,0), (0, taps - v[k].shape[1]))) if v[k].ndim == 2 else v[k] for v in (p, q)]) for k in self._ROW_PARAMS}
+            txs = list(txs) + [t for t,c in chans]
+        if p is None: p = self._row_params([])
+        order = np.argsort(txs, kind='stable')
+        p = {k: v[order] for k,v in p.items()}
+        max_lag = int((p['delay'] + p['delay_spread']).max(initial=0))
+        if max_lag > self.max_lag: #blocks must cover the longest channel of every row
+            self.max_lag = max_lag
+            self.nfft = self._nfft if self._nfft is not None else 1 << int(np.ceil(np.log2(4*(max_lag+1)))) #blocks ~4x the impulse response
+            self._rows = {}
+        self._rows[r] = self._build_row([int(txs[i]) for i in order], p)
+        self._rows[r].varying = varying
+    
+    @classmethod
+    def _row_params(cls, chans):
+        '''_ROW_PARAMS of a list of Channels, as arrays (noise is nan for None, the taps are padded with zeros).'''
+        p = {k: np.array([getattr(c, k) for c in chans], dtype=np.complex128 if k == 'dc_tx' else np.float64 if k in ['cfo', 'iq_imbal_tx'] else np.int64) 
+             for k in ['delay', 'delay_spread', 'num_taps', 'cfo', 'dc_tx', 'iq_imbal_tx']}
+        p['noise'] = np.array([np.nan if c.noise is None else c.noise for c in chans], dtype=np.float64)
+        taps = max([c.num_taps for c in chans], default=1)
+        p['paths'] = np.zeros((len(chans), taps), dtype=np.complex128)
+        p['path_delays'] = np.zeros((len(chans), taps), dtype=np.int64)
+        for i,c in enumerate(chans):
+            p['paths'][i, :len(c.paths)] = c.paths
+            p['path_delays'][i, :len(c.path_delays)] = c.path_delays
+        return p
+    
+    def _build_row(self, txs, p):
+        row = self.Row()
+        row.txs = tuple(txs)
+        h = np.zeros((len(txs), self.nfft), dtype=np.complex64) #tx, lag
+        used = np.arange(p['paths'].shape[1]) < p['num_taps'][:, None] #taps of each channel
+        lags = p['delay'][:, None] + p['path_delays'] #like Channel.impulse_response, at the bulk delay
+        np.add.at(h, (np.nonzero(used)[0], lags[used]), p['paths'][used])
+        iq = p['iq_imbal_tx'].astype(np.float32)
+        hf = np.fft.fft(h, axis=-1)
+        #the iq imbalance only scales the real part, so we also need the iq weighted sum (stacked after the plain sum)
+        row.hf = np.ascontiguousarray(np.stack((hf, hf*iq[:,None])).transpose(2,0,1)) #bin, 2, tx
+        cfo = p['cfo']
+        row.uniform_cfo = bool(len(cfo) == 0 or cfo.min() == cfo.max())
+        row.osc = Oscillator(float(cfo.max()) if len(cfo) else 0)
+        dc = p['dc_tx'].astype(np.complex64)
+        row.dc = (iq*dc.real).sum() + 1j*dc.imag.sum()
+        noise = p['noise'][~np.isnan(p['noise'])]
+        row.noise_std = np.sqrt(np.sum(10**(noise/10))) #the sum of the independent noise of every pair (each 10**(noise/20) per real dimension, as in Channel)
+        return row
+    
+    def spectra(self, x):
+        '''FFT the overlap-save blocks of the TX windows x (tx x (max_lag+num)).  These can be reused for any set of RX radios.'''
+        frames = _os_blocks(x, self.nfft, self.max_lag) #tx, block, nfft
+        return np.fft.fft(frames, axis=-1).astype(np.complex64).transpose(2,0,1) #bin, tx, block
+    
+    def filter(self, xf, txs, num, rx_ids):
+        '''
+        The taps of the channels into each of rx_ids applied to the spectra() of the windows of the TX radios txs (any others are silent).
+        Returns (2 x rx x num): the plain sum, and the sum weighted by the TX IQ imbalance.
+        '''
+        rows = [self.row(r) for r in rx_ids]
+        y = np.zeros((2, len(rows), num), dtype=np.complex64)
+        col = {t:i for i,t in enumerate(txs)}
+        groups = {}
+        for i,row in enumerate(rows): groups.setdefault(row.txs, []).append(i) #RX radios with the same TX radios go in one batch
+        for row_txs, idx in groups.items():
+            present = [k for k,t in enumerate(row_txs) if t in col]
+            if not present: continue
+            cols = [col[row_txs[k]] for k in present]
+            x = xf if cols == list(range(len(txs))) else xf[:, cols, :]
+            hf = np.concatenate([rows[i].hf for i in idx], axis=1)
+            if len(present) < len(row_txs): hf = hf[:, :, present]
+            yf = np.matmul(hf, x) #bin, 2*rx, block
+            yt = np.fft.ifft(yf, axis=0)[self.max_lag:] #keep only the fully overlapped part of every block
+            y[:, idx] = yt.transpose(1,2,0).reshape(len(idx), 2, -1)[:, :, :num].transpose(1,0,2)
+        return y
+    
+    def channelize(self, xf, txs, num, rx_ids, tick=None, extra=None, out=None):
+        '''
+        Apply the channels into each of rx_ids, given the spectra() of the windows of the TX radios txs.  Returns (rx x num), in out if given.
+        extra is added to the filter() output first, e.g., a cached response to other TX radios.
+        As for Channel.channelize, the CFO of each RX continues from its last call unless the tick is given.
+        '''
+        nrx = len(rx_ids)
+        rows = [self.row(r) for r in rx_ids]
+        y = self.filter(xf, txs, num, rx_ids)
+        if extra is not None: y += extra
+        cfo = np.ones((nrx, num), dtype=np.complex64)
+        for c,row in zip(cfo, rows): row.osc.rotate(c, tick)
+        if out is None: out = np.empty((nrx, num), dtype=np.complex64)
+        out.real = (y[1]*cfo).real #apply cfo, then iq imbalance of the real part
+        out.imag = (y[0]*cfo).imag
+        out += np.array([row.dc for row in rows], dtype=np.complex64)[:, None]
+        self._noise.add(out, np.array([row.noise_std for row in rows])[:, None]) #add noise
+        return out
+        
+class SharedArrays:
+    '''
+    A set of named numpy arrays laid out in one multiprocessing.shared_memory block, so several processes can map them.
+    The block starts with a small JSON header describing the layout, so attaching only needs the name.
+    '''
+    _HEADER = 4096
+    
+    def __init__(self, name, layout=None):
+        '''Create the block if a layout (list of (key, shape, dtype)) is given, otherwise attach to an existing one.'''
+        if layout is not None:
+            entries = []
+            offset = self._HEADER
+            for key, shape, dtype in layout:
+                entries.append((key, list(shape), np.dtype(dtype).str, offset))
+                offset += -(-int(np.prod(shape))*np.dtype(dtype).itemsize//64)*64 #keep every array cache line aligned
+            header = json.dumps(entries).encode()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=offset)
+            self.shm.buf[:8] = len(header).to_bytes(8, 'little')
+            self.shm.buf[8:8+len(header)] = header
+        else:
+            try: self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError: #before python 3.13 every process that maps the block would also unlink it at exit
+                self.shm = shared_memory.SharedMemory(name=name)
+                if parent_process() is None: resource_tracker.unregister(self.shm._name, 'shared_memory') #multiprocessing children share their parent's tracker
+            size = int.from_bytes(self.shm.buf[:8], 'little')
+            entries = json.loads(bytes(self.shm.buf[8:8+size]))
+        self.name = name
+        self.arrays = {key: np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offset) for key, shape, dtype, offset in entries}
+    
+    def __getitem__(self, key):
+        return self.arrays[key]
+    
+    def close(self, unlink=False):
+        self.arrays = {}
+        self.shm.close()
+        if unlink: self.shm.unlink()
+
+class SharedLock:
+    '''Reentrant inter-process lock (flock on a file named after the shared emulation) for changes to the set of radios.'''
+    def __init__(self, name):
+        self.path = os.path.join(tempfile.gettempdir(), name + '.lock')
+        self.depth = 0
+        self._thread_lock = threading.RLock() #flock is per process, so threads take turns first
         
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self.depth == 0:
+            self.f = open(self.path, 'a')
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        self.depth += 1
         
+    def __exit__(self, *argv):
+        self.depth -= 1
+        if self.depth == 0:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+        self._thread_lock.release()
+
 class Stream:
-    '''Simple abstraction layer to keep track of channel IDs for the channel emulator.'''
+    '''
+    Simple abstraction layer to keep track of channel IDs for the channel emulator.
+    It also tracks the tick (on the ChanEmu sample clock) of the next sample to be read or written.
+    Fixed point formats (CS16, CS12) are converted straight to and from the caller's buffers.
+    
+    Like a real stream, every call moves at most "mtu" samples, RX streams must be activated (for a burst of numElems,
+    with END_BURST, or continuously), and reads time out if the samples aren't there yet: in the 'samples' timebase 
+    a read with a timeout can always advance the clock, but a read with timeoutUs=0 only gets samples the clock has 
+    already passed.  Falling behind the clock by more than the ChanEmu buffers is an overflow (RX) or underflow (TX),
+    which readStream returns and readStreamStatus reports, along with late timed writes and END_BURST acks.
+    Times (timeNs) are hardware times of the stream's radio, see Device.setHardwareTime.
+    
+    With SOAPY_SDR_WAIT_TRIGGER, an RX activation (or a TX burst) starts on the tick the radio sees the next 
+    trigger (TRIGGER_GEN), like a Faros chain.  TX bursts are held by the ChanEmu until then.
     
-    def __init__(self, chan_ids):
+    For direct access, the stream has a pool of NUM_DIRECT_BUFFERS preallocated buffers (of up to DIRECT_BUFFER_SIZE
+    samples per channel) that are handed out as numpy views.  The batched engine channelizes CF32 reads straight into them,
+    other formats are converted into them from a temporary, as readStream does.  This only saves a copy per read, which is
+    small next to the channelization itself (see benchmarks.py direct).
+    '''
+    NUM_DIRECT_BUFFERS = 8
+    DIRECT_BUFFER_SIZE = 8192
+    
+    def __init__(self, chan_ids, fmt=SOAPY_SDR_CF32, direction=SOAPY_SDR_RX, mtu=None):
         #print(chan_ids)
+        if fmt not in _FORMAT_BYTES: raise ValueError("Unsupported stream format " + str(fmt))
         self.chan_ids = chan_ids
+        self.fmt = fmt
+        self.direction = direction
         self.chan_em = ChanEmu()
+        self.mtu = mtu if mtu is not None else self.chan_em._bufsize
+        self.tick = None #None until given a time, then the stream just follows on from its last sample
+        self.active = False
+        self.burst = None #RX samples left in the burst, or None if continuous
+        self.trigger = None #ChanEmu trigger_count the stream is waiting for, or None
+        self._trigger_offset = 0 #ticks of the TX burst already queued for the trigger
+        self.status = collections.deque(maxlen=64) #StreamReturns for readStreamStatus
+        self._pool = None #direct access buffers, handle x channel x samples (in the stream format)
+        self._free = None #handles not acquired
+        self._pool_cond = threading.Condition()
+        
+    def _start_tick(self, flags, timeNs):
+        '''Tick of the first sample of this call: the requested time if HAS_TIME, otherwise continue the stream.'''
+        if flags & SOAPY_SDR_HAS_TIME:
+            self.tick = self._ticks(timeNs)
+        elif self.tick is None:
+            self.tick = self.chan_em.now()
+        return self.tick
+    
+    def _ticks(self, timeNs):
+        '''Emulated clock tick of a hardware time.'''
+        return self.chan_em.ticks(timeNs) - int(self.chan_em._time_offsets[self.chan_ids[0]])
+    
+    def _time_ns(self, tick):
+        '''Hardware time of an emulated clock tick.'''
+        return self.chan_em.time_ns(tick + int(self.chan_em._time_offsets[self.chan_ids[0]]))
+    
+    def _event(self, ret, flags, tick):
+        self.status.append(StreamReturn(ret, flags | SOAPY_SDR_HAS_TIME, self._time_ns(tick)))
+    
+    def activate(self, flags=0, timeNs=0, numElems=0):
+        self.tick = None
+        self.active = True
+        self.burst = numElems if flags & SOAPY_SDR_END_BURST and numElems > 0 else None
+        self.trigger = self.chan_em.trigger_count if flags & SOAPY_SDR_WAIT_TRIGGER else None
+        if flags & SOAPY_SDR_HAS_TIME: self._start_tick(flags, timeNs)
+        
+    def deactivate(self, flags=0, timeNs=0):
+        self.active = False
         
     def write(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        if flags & SOAPY_SDR_WAIT_TRIGGER: return self._write_on_trigger(buffs, numElems, flags)
+        continuing = self.tick is not None
+        tick = self._start_tick(flags, timeNs)
+        em = self.chan_em
+        now = em.now()
+        if tick < now:
+            if flags & SOAPY_SDR_HAS_TIME:
+                self._event(SOAPY_SDR_TIME_ERROR, 0, tick) #late, but send it anyway
+            elif continuing:
+                self._event(SOAPY_SDR_UNDERFLOW, 0, now) #the stream ran dry, pick up from now
+                tick = now
+        num = min(numElems, self.mtu)
+        if em.timebase == 'wall' and tick + num > now + em._bufsize: #no room in the ring yet (the samples clock only moves with reads, so it can't fill up)
+            now = em.wait_until(tick + num - em._bufsize, timeoutUs)
+            num = min(num, now + em._bufsize - tick)
+            if num <= 0: return StreamReturn(SOAPY_SDR_TIMEOUT)
         for i,buff in enumerate(buffs):
-            self.chan_em.write(buff[:numElems],self.chan_ids[i])
-        return StreamReturn(numElems)
-    def read(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+            em.write(dequantize(buff, num, self.fmt),self.chan_ids[i],tick)
+        done = num == numElems and flags & SOAPY_SDR_END_BURST
+        self.tick = None if done else tick + num #the next burst starts wherever the clock is, unless timed
+        if done: self._event(0, SOAPY_SDR_END_BURST, tick + num)
+        return StreamReturn(num, flags if num == numElems else flags & ~SOAPY_SDR_END_BURST, self._time_ns(tick))
+    
+    def _write_on_trigger(self, buffs, numElems, flags):
+        '''Queue (up to an MTU of) a TX burst for the next trigger.  The following writes continue the burst, until END_BURST.'''
+        if self.trigger is None: self.trigger, self._trigger_offset = self.chan_em.trigger_count, 0
+        num = min(numElems, self.mtu)
         for i,buff in enumerate(buffs):
-            buff[:numElems] = self.chan_em.read(numElems,self.chan_ids[i])
-        return StreamReturn(numElems)
+            self.chan_em.trigger_write(dequantize(buff, num, self.fmt), self.chan_ids[i], self.trigger, self._trigger_offset)
+        self._trigger_offset += num
+        if num == numElems and flags & SOAPY_SDR_END_BURST: self.trigger = None
+        return StreamReturn(num, flags if num == numElems else flags & ~SOAPY_SDR_END_BURST)
+    
+    def read(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        def fill(tick, num):
+            samps = self.chan_em.read_many(num,self.chan_ids[:len(buffs)],tick)
+            for buff,s in zip(buffs,samps):
+                quantize(s, buff, self.fmt)
+        return self._read(fill, numElems, flags, timeNs, timeoutUs)
+    
+    def _read(self, fill, numElems, flags, timeNs, timeoutUs):
+        '''Work out how many samples a read gets (and when), then fill(tick, num) the buffers.'''
+        if not self.active: return StreamReturn(SOAPY_SDR_TIMEOUT)
+        em = self.chan_em
+        if self.trigger is not None: #the activation waits for a trigger
+            tick = em.wait_trigger(self.trigger, self.chan_ids[0], timeoutUs)
+            if tick is None: return StreamReturn(SOAPY_SDR_TIMEOUT)
+            self.tick, self.trigger = tick, None
+        tick = self._start_tick(flags, timeNs)
+        now = em.now()
+        if not flags & SOAPY_SDR_HAS_TIME and tick < now - em._bufsize: #the consumer fell behind, the samples are gone
+            self.tick = now
+            self._event(SOAPY_SDR_OVERFLOW, 0, tick)
+            return StreamReturn(SOAPY_SDR_OVERFLOW, SOAPY_SDR_HAS_TIME, self._time_ns(tick))
+        num = min(numElems, self.mtu, self.burst if self.burst is not None else numElems)
+        if tick + num > now:
+            if timeoutUs == 0: num = now - tick #only what's already there
+            elif em.timebase == 'wall': num = min(num, em.wait_until(tick + num, timeoutUs) - tick)
+        if num <= 0: return StreamReturn(SOAPY_SDR_TIMEOUT)
+        fill(tick, num)
+        self.tick = tick + num
+        ret_flags = SOAPY_SDR_HAS_TIME
+        if self.burst is not None:
+            self.burst -= num
+            if self.burst == 0:
+                self.active = False
+                ret_flags |= SOAPY_SDR_END_BURST
+        if num == self.mtu and num < numElems: ret_flags |= SOAPY_SDR_MORE_FRAGMENTS #cut short by the MTU, the rest is ready
+        return StreamReturn(num, ret_flags, self._time_ns(tick))
+    
+    def _acquire(self, timeoutUs):
+        '''Handle of a free direct access buffer, or None if none is released in time.'''
+        with self._pool_cond:
+            if self._pool is None:
+                size = min(self.mtu, self.DIRECT_BUFFER_SIZE)
+                self._pool = np.stack([np.stack([formatBuffer(self.fmt, size) for c in self.chan_ids]) for h in range(self.NUM_DIRECT_BUFFERS)])
+                self._free = collections.deque(range(self.NUM_DIRECT_BUFFERS))
+            if not self._pool_cond.wait_for(lambda: self._free, timeoutUs/1e6): return None
+            return self._free.popleft()
+        
+    def release(self, handle):
+        with self._pool_cond:
+            self._free.append(handle)
+            self._pool_cond.notify()
+        
+    def buffer_addrs(self, handle):
+        if self._pool is None: self.release(self._acquire(0))
+        return [b.ctypes.data for b in self._pool[handle]]
+    
+    def acquire_read(self, timeoutUs=int(1e5)):
+        '''Read up to a buffer of samples into a direct access buffer.  The StreamReturn also has the handle and buffs (views of the pool).'''
+        handle = self._acquire(timeoutUs)
+        if handle is None: return StreamReturn(SOAPY_SDR_TIMEOUT)
+        pool = self._pool[handle]
+        size = pool.shape[-1]*pool.itemsize//_FORMAT_BYTES[self.fmt]
+        def fill(tick, num):
+            if self.fmt == SOAPY_SDR_CF32: self.chan_em.read_many(num, self.chan_ids, tick, out=pool[:, :num]) #the batched engine writes its output straight into the pool
+            else: 
+                for buff,s in zip(pool, self.chan_em.read_many(num, self.chan_ids, tick)): quantize(s, buff, self.fmt)
+        sr = self._read(fill, size, 0, 0, timeoutUs)
+        if sr.ret <= 0:
+            self.release(handle)
+            return sr
+        sr.handle = handle
+        sr.buffs = [b[:sr.ret*b.shape[0]//size] for b in pool]
+        return sr
+    
+    def acquire_write(self, timeoutUs=int(1e5)):
+        '''A direct access buffer to fill and then release_write.  The StreamReturn has the number of samples it holds, the handle, and buffs.'''
+        handle = self._acquire(timeoutUs)
+        if handle is None: return StreamReturn(SOAPY_SDR_TIMEOUT)
+        pool = self._pool[handle]
+        sr = StreamReturn(pool.shape[-1]*pool.itemsize//_FORMAT_BYTES[self.fmt])
+        sr.handle = handle
+        sr.buffs = list(pool)
+        return sr
+    
+    def release_write(self, handle, numElems, flags=0, timeNs=0):
+        '''Transmit the first numElems of a direct access buffer, and hand it back.'''
+        try: return self.write(self, list(self._pool[handle]), numElems, flags, timeNs)
+        finally: self.release(handle)
+    
+    def read_status(self, timeoutUs=int(1e5)):
+        '''Next event for readStreamStatus.  Events are only made by reads and writes, so this doesn't wait for one.'''
+        return self.status.popleft() if self.status else StreamReturn(SOAPY_SDR_TIMEOUT)
     
 class ChanEmu:
     '''
     Implements shared buffers for every TX "stream", as well as an NxN set of channels for every SDR radio interface.
     When an rx radio "reads" the channel, it channelizes every TX buffer, using its unique channel to that rx radio, then sums them.
-    This implementation is lacking any notion of rate or timestamps.
+    
+    Every TX buffer is a ring indexed by the absolute tick (sample count) of the emulated sample clock, so timed writes
+    land at their tick offset and reads are served from the matching time window.  TX samples that were never written 
+    (or have already been overwritten in the ring) read as zeros.
+    
+    With engine='batched' (default) the channels are applied through a ChannelMatrix, so that all the RX radios of
+    a read are computed in one pass, and the TX spectra are shared by every read of the same time window.
+    engine='loop' channelizes every TX/RX pair separately.
+    
+    Channels are created (with channel_args, and reproducibly if a seed is given) on the first read that uses a 
+    TX/RX pair, so startup is fast for large arrays.  If a
+    coupling_radius is set, radios further apart than that (in chan_id units, or wavelengths with a geometry) aren't coupled at all, 
+    which keeps memory and per-read cost bounded by the radius rather than the array size.
+    With an ArrayGeometry, the taps of every channel come from the positions of the radios (all at the same bulk delay),
+    and channel_args only sets the other impairments.
+    
+    All radios are on one trigger chain: trigger() fires on the current tick and every radio sees it trigger_delays 
+    later (TRIGGER_HOP more per radio down the chain) until sync_delays() lines them up.  TX bursts waiting for
+    a trigger are held in the process that wrote them.
+    
+    Reads and writes can come from many threads: every radio has its own TX lock (held while its ring buffer is 
+    accessed) and RX lock (held while it is channelized, since the channels into it keep CFO and fading state),
+    and the batched matrix is copied rather than changed while it may be in use.
+    
+    The emulation can be moved into shared memory with share(name), then other processes attach(name) to the same
+    virtual air: TX buffers, gains, the clock, and the channel parameters are shared, each process channelizes its own reads.
+    Radios are identified by serial, so a Device opened with a known serial (in any process) uses the same radio.
     '''
     _instance = None
+    _INT_PARAMS = ['delay', 'delay_spread', 'num_taps', 'fading', 'fade_seed']
+    _FIELDS = ['state', 'config', 'triggers', 'bufs', 'heads', 'versions', 'tx_gains', 'rx_gains', 'serials', 'replay', 'replay_lens', 'replay_versions', 'time_offsets', 'armed_times', 'trigger_delays'] #then per radio state, (capacity x ...)
+    REPLAY_SIZE = 4096 #samples of TX RAM for continuous replay, like an Iris
+    REPLAY_CACHE_SIZE = 1 << 16 #longest combined period of the replays (lcm of their lengths) to cache the responses to
+    TRIGGER_HISTORY = 64 #ticks of the latest triggers, so a stream can still find the one it waited on
+    TRIGGER_HOP = 3 #trigger delay (in ticks) added by every radio down the chain, until SYNC_DELAYS
 
-    def __new__(cls, bufsize=204800):
+    def __new__(cls, bufsize=204800, rate=1e6, engine='batched', coupling_radius=None, seed=None, channel_args=None, timebase='samples', geometry=None):
         '''Singleton pattern.'''
         if cls._instance is None:
             cls._instance = super(ChanEmu, cls).__new__(cls)
-            cls._bufsize=bufsize
-            cls._bufs = []
-            cls._channels = [[Channel()]]
-            cls.tx_gains = []
-            cls.rx_gains = []
+            cls._shared = None #SharedArrays when the emulation is in shared memory
+            cls._lock = threading.RLock() #changes to the set of radios and channels
+            cls._matrix_lock = threading.Lock()
+            cls._radio_locks = {} #('tx' or 'rx', chan_id) -> threading.Lock
+            cls._channels = {} #(rx, tx) -> Channel, for the pairs used so far
+            cls.seed = seed
+            cls.channel_args = {} if channel_args is None else channel_args #Channel() arguments, e.g., to make every channel fade
+            cls.engine = engine
+            cls.geometry = geometry #ArrayGeometry that the channel taps come from, if any
+            cls._matrix = None #ChannelMatrix, rebuilt when the channels change
+            cls._spectra = None #(key, spectra) of the last batched read
+            cls._pending = [] #(trigger count, chan_id, offset, samples) of TX bursts waiting for a trigger
+            cls._scenario = None #channel tables of a loaded scenario, see load_scenario()
+            cls._alloc(cls._layout(4, bufsize), copy=False) #nothing to carry over from a closed emulation
+            cls._state[2] = bufsize
+            cls._config[:] = [rate, np.nan if coupling_radius is None else coupling_radius, np.nan, 0]
+            cls._instance.set_timebase(timebase)
             #cls._buf = np.zeros(bufsize, dtype=np.complex64)
         return cls._instance
     
-    def add_chan(cls):
+    @classmethod
+    def _layout(cls, capacity, bufsize, max_taps=None):
+        '''Arrays of the emulation state.  The channel parameters are only stored as arrays (max_taps) when shared.'''
+        layout = [('state', (4,), np.int64), #number of radios, emulated time, buffer size, number of triggers
+                  ('config', (4,), np.float64), #rate, coupling radius (nan for none), wall clock time and tick of the 'wall' timebase (nan for 'samples')
+                  ('triggers', (cls.TRIGGER_HISTORY,), np.int64), #tick of trigger k at k % TRIGGER_HISTORY
+                  ('bufs', (capacity, bufsize), np.complex64),
+                  ('heads', (capacity,), np.int64), #tick just past the last sample written to each TX buffer
+                  ('versions', (capacity,), np.int64), #bumped on every TX write, so cached TX spectra are reused until then
+                  ('tx_gains', (capacity,), np.float64),
+                  ('rx_gains', (capacity,), np.float64),
+                  ('serials', (capacity,), 'S32'),
+                  ('replay', (capacity, cls.REPLAY_SIZE), np.complex64), #TX_REPLAY waveform, repeated forever
+                  ('replay_lens', (capacity,), np.int64), #0 when not replaying
+                  ('replay_versions', (capacity,), np.int64), #bumped on every set_replay, so cached responses to the replay are reused until then
+                  ('time_offsets', (capacity,), np.int64), #hardware time (in ticks) minus the emulated clock
+                  ('armed_times', (capacity,), np.float64), #timeNs for setHardwareTime(t, "TRIGGER") to set on the next trigger, nan if not armed
+                  ('trigger_delays', (capacity,), np.int64)] #ticks from a trigger until the radio sees it
+        if max_taps is not None:
+            layout.append(('created', (capacity, capacity), np.bool_))
+            for k in Channel._PARAMS:
+                if k in ['paths', 'path_delays']:
+                    layout.append((k, (capacity, capacity, max_taps), np.complex128 if k == 'paths' else np.int64))
+                else:
+                    layout.append((k, (capacity, capacity), np.complex128 if k.startswith('dc') else np.int64 if k in cls._INT_PARAMS else np.float64))
+        return layout
+    
+    @classmethod
+    def _alloc(cls, layout, shared=None, copy=True):
+        '''Point the state at new arrays (in shared memory if given), copying over whatever is already there.'''
+        arrays = shared.arrays if shared is not None else {k: np.zeros(shape, dtype) for k,shape,dtype in layout}
+        for k in cls._FIELDS:
+            old = getattr(cls, '_' + k, None)
+            if copy and old is not None: arrays[k][tuple(slice(0,d) for d in old.shape)] = old
+            setattr(cls, '_' + k, arrays[k])
+        cls._table = arrays if shared is not None else None
+        cls.tx_gains = cls._tx_gains
+        cls.rx_gains = cls._rx_gains
+    
+    @property
+    def time(cls):
+        '''Furthest tick read by any RX radio.'''
+        return int(cls._state[1])
+    
+    @time.setter
+    def time(cls, tick):
+        cls._state[1] = tick
+        
+    @property
+    def rate(cls):
+        '''Emulated sample rate, shared by every radio.'''
+        return float(cls._config[0])
+    
+    @property
+    def timebase(cls):
+        return 'samples' if np.isnan(cls._config[2]) else 'wall'
+    
+    def set_timebase(cls, timebase):
+        '''
+        'samples': the emulated clock is the furthest RX read, so it only advances as fast as samples are read (and never drops any).
+        'wall': the emulated clock runs at the sample rate in real time, from the current tick.
+        '''
+        if timebase not in ['samples', 'wall']: raise ValueError("timebase must be 'samples' or 'wall'")
+        now = cls.now()
+        cls._config[2:] = [np.nan if timebase == 'samples' else time.time(), now]
+    
+    def now(cls):
+        '''Current tick of the emulated sample clock.'''
+        if np.isnan(cls._config[2]): return cls.time
+        return int(cls._config[3] + (time.time() - cls._config[2])*cls._config[0])
+    
+    def wait_until(cls, tick, timeoutUs):
+        '''Wait (in the wall timebase) until the clock reaches tick, or the timeout runs out, and return the current tick.'''
+        deadline = time.time() + timeoutUs/1e6
+        now = cls.now()
+        while now < tick and cls.timebase == 'wall':
+            remaining = min(deadline - time.time(), (tick - now)/cls.rate)
+            if remaining <= 0: break
+            time.sleep(remaining)
+            now = cls.now()
+        return now
+    
+    @property
+    def coupling_radius(cls):
+        r = float(cls._config[1])
+        return None if r != r else r #nan for none (r != r is much cheaper than np.isnan, and this is checked for every pair)
+    
+    @coupling_radius.setter
+    def coupling_radius(cls, radius):
+        cls._config[1] = np.nan if radius is None else radius
+        cls._matrix = None
+    
+    @property
+    def num_radios(cls):
+        return int(cls._state[0])
+    
+    @property
+    def _bufsize(cls):
+        return int(cls._state[2])
+    
+    def share(cls, name, capacity=64, max_taps=16):
+        '''Move the emulation (including any radios already added) into shared memory so other processes can attach(name).'''
+        if fcntl is None: raise RuntimeError("Shared emulation needs fcntl (i.e., Linux or macOS)")
+        if capacity < cls.num_radios: raise ValueError("capacity is smaller than the number of radios")
+        shared = SharedArrays(name, cls._layout(capacity, cls._bufsize, max_taps))
+        cls._alloc(None, shared)
+        cls._shared = shared
+        cls._lock = SharedLock(name)
+        for (r,t),c in cls._channels.items(): cls._store_channel(r, t, c)
+        
+    def attach(cls, name):
+        '''Use the shared emulation created by share(name) in another process.'''
+        if fcntl is None: raise RuntimeError("Shared emulation needs fcntl (i.e., Linux or macOS)")
+        shared = SharedArrays(name)
+        cls._alloc(None, shared, copy=False) #don't copy our own state over the shared one
+        cls._shared = shared
+        cls._lock = SharedLock(name)
+        cls._channels = {}
+        cls._matrix = None
+        cls._spectra = None
+    
+    def close(cls, unlink=False):
+        '''Detach from the shared memory (and remove it, if unlink), then go back to an empty local emulation.'''
+        if cls._shared is not None: cls._shared.close(unlink)
+        ChanEmu._instance = None
+    
+    def _store_channel(cls, r, t, c, table=None):
+        '''Store the parameters of a channel in the shared emulation (or a scenario table).'''
+        if table is None: table = cls._table
+        table['created'][r, t] = True
+        for k,v in c.params().items():
+            if k in ['paths', 'path_delays']:
+                if len(v) > table[k].shape[2]: raise ValueError("Channel has more taps than the shared emulation supports")
+                table[k][r, t, :len(v)] = v
+            elif k == 'fading':
+                table[k][r, t] = Channel._FADING.index(v)
+            else:
+                table[k][r, t] = np.nan if v is None else v
+                
+    def _load_channel(cls, r, t, table=None):
+        '''Rebuild a channel from the shared emulation (or a scenario table).'''
+        if table is None: table = cls._table
+        p = {k: table[k][r, t] for k in Channel._PARAMS}
+        for k in cls._INT_PARAMS: p[k] = int(p[k])
+        for k in ['cfo', 'iq_imbal_tx', 'iq_imbal_rx', 'doppler', 'k_factor']: p[k] = float(p[k])
+        for k in ['dc_tx', 'dc_rx']: p[k] = complex(p[k]) #python scalars, like a drawn channel, so they don't promote the complex64 math
+        p['fading'] = Channel._FADING[p['fading']]
+        p['noise'] = None if np.isnan(p['noise']) else float(p['noise'])
+        p['paths'] = p['paths'][:p['num_taps']]
+        p['path_delays'] = p['path_delays'][:p['num_taps']]
+        return Channel.from_params(**p)
+    
+    def save_scenario(cls, path, complete=True):
+        '''
+        Save the radios (serials, gains, trigger delays), their channels, the geometry, and the seed to an npz file, for load_scenario().
+        With complete, every coupled pair is drawn first, otherwise only the channels used so far are saved.
+        Channel state that changes as it runs (CFO phase, fading time) isn't saved.
+        '''
+        n = cls.num_radios
+        if complete:
+            for r in range(n):
+                for t in range(n): cls.channel(r, t)
+        with cls._lock: channels = dict(cls._channels)
+        max_taps = max([c.num_taps for c in channels.values()] + [1])
+        table = {k: np.zeros(shape, dtype) for k,shape,dtype in cls._layout(n, 0, max_taps) if k in Channel._PARAMS or k == 'created'}
+        for (r,t),c in channels.items(): cls._store_channel(r, t, c, table)
+        if cls.geometry is not None: table.update({'geometry_' + k: v for k,v in cls.geometry.params().items()})
+        np.savez(path, serials=cls._serials[:n], tx_gains=cls._tx_gains[:n], rx_gains=cls._rx_gains[:n], 
+                 trigger_delays=cls._trigger_delays[:n], config=cls._config[:2], 
+                 seed=np.zeros(0, dtype=np.uint64) if cls.seed is None else np.atleast_1d(np.asarray(cls.seed, dtype=np.uint64)), **table)
+    
+    def load_scenario(cls, path):
+        '''
+        Add the radios of a save_scenario() file to an empty emulation, with their saved channels (and geometry, if it had one).  
+        The file is memory mapped, and channels are only built when first used, so large scenarios load instantly.  
+        Open devices with the saved serials to use them.
+        '''
+        scenario = loadNpz(path)
+        with cls._lock:
+            if cls.num_radios: raise RuntimeError("Scenarios can only be loaded into an empty emulation")
+            n = len(scenario['serials'])
+            cls.add_chans([serial.decode() for serial in scenario['serials']])
+            for k in ['tx_gains', 'rx_gains', 'trigger_delays']: getattr(cls, '_' + k)[:n] = scenario[k]
+            cls._config[:2] = scenario['config']
+            if 'seed' in scenario: #the batched noise and new channels are drawn as when it was saved
+                seed = [int(v) for v in scenario['seed']]
+                cls.seed = None if not seed else seed[0] if len(seed) == 1 else seed
+            if 'geometry_positions' in scenario: #the coupling_radius is in wavelengths again, and new channels come from the same scatterers
+                p = {k: scenario['geometry_' + k] for k in ArrayGeometry._PARAMS}
+                cls.geometry = ArrayGeometry(**dict(p, freq=float(p['freq']), attn=float(p['attn']), ref=float(p['ref']), los=bool(p['los'])))
+            cls._matrix = None
+            cls._channels = {}
+            cls._scenario = scenario
+        
+    def _scenario_row(cls, r):
+        '''For ChannelMatrix: the coupled TX radios whose static channels into r are in the scenario (and not made into Channels yet), and their parameters.'''
+        scenario = cls._scenario
+        if scenario is None or r >= len(scenario['created']): return [], None
+        radius = cls.coupling_radius
+        txs = [int(t) for t in np.flatnonzero(scenario['created'][r] & (scenario['fading'][r] == 0)) 
+               if t != r and (r, t) not in cls._channels and (radius is None or cls.distance(r, t) <= radius)]
+        return txs, {k: scenario[k][r, txs] for k in ChannelMatrix._ROW_PARAMS}
+        
+    def _sync(cls):
+        '''Pick up radios added by other processes.'''
+        if cls._matrix is not None and cls._matrix.num_radios != cls.num_radios:
+            cls._matrix = None
+            cls._spectra = None
+    
+    def _radio_lock(cls, kind, chan_id):
+        lock = cls._radio_locks.get((kind, chan_id))
+        return lock if lock is not None else cls._radio_locks.setdefault((kind, chan_id), threading.Lock()) #setdefault is atomic
+    
+    def _all_tx_locks(cls):
+        '''Context holding the TX lock of every radio, e.g., to reallocate the buffers.'''
+        stack = ExitStack()
+        for i in range(cls.num_radios): stack.enter_context(cls._radio_lock('tx', i))
+        return stack
+    
+    def distance(cls, rx, tx):
+        '''Distance between two radios, as compared to the coupling_radius.'''
+        if cls.geometry is not None: return cls.geometry.distance(rx, tx)
+        return abs(rx - tx)
+    
+    def _geometric_channel(cls, rx, tx, seed):
+        '''A Channel with the impairments of channel_args, but the taps of the geometry.'''
+        if cls.geometry.num_radios <= max(rx, tx): raise ValueError("The geometry has no position for radio %d" % max(rx, tx))
+        h, lags = cls.geometry.row(rx, cls.rate)
+        c = Channel(seed=seed, **dict(cls.channel_args, delay_var=0)) #one bulk delay, so the arrays stay coherent
+        c.paths, c.path_delays = h[:, tx].tolist(), lags[:, tx].tolist()
+        c.num_taps, c.delay_spread = len(c.paths), max(c.path_delays)
+        return c
+    
+    def channel(cls, rx, tx):
+        '''The Channel from tx to rx (created on first use), or None if they aren't coupled.  channel(r, r) holds the RX impairments of r.'''
+        if rx == tx or cls.coupling_radius is None or cls.distance(rx, tx) <= cls.coupling_radius:
+            c = cls._channels.get((rx, tx))
+            if c is None:
+                with cls._lock:
+                    c = cls._channels.get((rx, tx)) #another thread may have just made it
+                    if c is not None: return c
+                    if cls._shared is not None and cls._table['created'][rx, tx]:
+                        c = cls._load_channel(rx, tx) #another process already drew this one
+                    else:
+                        scenario = cls._scenario
+                        if scenario is not None and max(rx, tx) < len(scenario['created']) and scenario['created'][rx, tx]:
+                            c = cls._load_channel(rx, tx, scenario)
+                        else:
+                            seed = None if cls.seed is None else np.random.SeedSequence(cls.seed, spawn_key=(rx, tx)) #the same seed gives the same channels, whatever order they are used in
+                            c = Channel(seed=seed, **cls.channel_args) if cls.geometry is None or rx == tx else cls._geometric_channel(rx, tx, seed)
+                        if cls._shared is not None: cls._store_channel(rx, tx, c)
+                    cls._channels[(rx, tx)] = c #before the lock is released, so every thread gets this one
+            return c
+        return None
+    
+    def add_chan(cls, serial=''):
+        '''Add a radio interface (TX and RX) to the emulation and return its chan_id.'''
+        return cls.add_chans([serial])[0]
+    
+    def add_chans(cls, serials):
+        '''Add a radio interface for each serial in one go (growing the buffers at most once), and return their chan_ids.'''
         #right now we make every radio tx and rx, and add them on device creation
-        #we could be more efficient by only creating channels when the stream is created, and only for tx or rx
-        cls._bufs.append(np.zeros(cls._bufsize, dtype=np.complex64)) #one buffer per radio
-        if len(cls._bufs) > 1: #awkwardly grow square list of lists of channels
-            for c in cls._channels:
-                c.append(Channel())
-            cls._channels.append([Channel() for i in range(len(cls._channels)+1)])
-        cls.tx_gains.append(0)
-        cls.rx_gains.append(0)
+        #the channels to and from it are only created once they are used
+        with cls._lock:
+            first = cls.num_radios
+            end = first + len(serials)
+            if end > cls._bufs.shape[0]:
+                if cls._shared is not None: raise RuntimeError("The shared emulation is full (capacity %d)" % cls._bufs.shape[0])
+                capacity = cls._bufs.shape[0]
+                while capacity < end: capacity *= 2 #grow by doubling
+                with cls._all_tx_locks(): cls._alloc(cls._layout(capacity, cls._bufsize))
+            cls._serials[first:end] = [s.encode() for s in serials]
+            cls._armed_times[first:end] = np.nan
+            cls._state[0] = end
+            cls._matrix = None
+            cls._spectra = None
+        return list(range(first, end))
+    
+    def open_radio(cls, serial, num_chan):
+        '''Return the chan_ids of the radio with this serial, adding it (with num_chan interfaces) if it isn't in the emulation yet.'''
+        return cls.open_radios([serial], num_chan)[0]
+    
+    def open_radios(cls, serials, num_chan):
+        '''open_radio() for a list of serials, adding all the new radios at once.  Returns a list of chan_ids for each serial.'''
+        with cls._lock:
+            cls._sync()
+            known = {} #serial -> chan_ids of the radios already in the emulation
+            for c,serial in enumerate(cls._serials[:cls.num_radios].tolist()): known.setdefault(serial.decode(), []).append(c)
+            known = {serial: ids for serial,ids in known.items() if serial and len(ids) == num_chan}
+            slots = [] #for every serial, its chan_ids or the index of the new radio
+            new = [] #serials of the radios to add
+            for serial in serials:
+                if serial in known: 
+                    slots.append(known[serial])
+                    continue
+                if serial: known[serial] = len(new) #opened twice in the list, it's the same new radio
+                slots.append(len(new))
+                new.append(serial)
+            first = cls.num_radios
+            ids = cls.add_chans([serial for serial in new for i in range(num_chan)])
+            hops = (first + np.arange(len(new))*num_chan)//num_chan #position in the trigger chain
+            cls._trigger_delays[ids] = np.repeat(hops*cls.TRIGGER_HOP, num_chan)
+        return [ids[s*num_chan:(s+1)*num_chan] if isinstance(s, int) else s for s in slots]
+    
+    def set_rate(cls, rate):
+        if cls.timebase == 'wall': cls._config[2:] = [time.time(), cls.now()] #keep the clock continuous
+        cls._config[0] = rate
+    
+    def ticks(cls, timeNs):
+        return int(round(timeNsToTicks(timeNs, cls.rate)))
+    
+    def time_ns(cls, ticks):
+        return int(round(ticksToTimeNs(ticks, cls.rate)))
+        
+    @property
+    def trigger_count(cls):
+        '''Number of triggers so far.  A stream waiting for a trigger waits for trigger number trigger_count.'''
+        return int(cls._state[3])
+    
+    def hardware_time(cls, chan_id):
+        '''Hardware time (ns) of chan_id, i.e., the emulated clock plus its time offset.'''
+        return cls.time_ns(cls.now() + int(cls._time_offsets[chan_id]))
+    
+    def set_hardware_time(cls, chan_id, timeNs, on_trigger=False):
+        '''Set the hardware time of chan_id now, or (on_trigger) when it sees the next trigger.'''
+        if on_trigger: cls._armed_times[chan_id] = timeNs
+        else: cls._time_offsets[chan_id] = cls.ticks(timeNs) - cls.now()
+    
+    def sync_delays(cls):
+        '''SYNC_DELAYS: line up the trigger delays of every radio, so they all see a trigger on the same tick.'''
+        with cls._radio_lock('trigger', 0):
+            n = cls.num_radios
+            if n: cls._trigger_delays[:n] = cls._trigger_delays[:n].max()
+    
+    def trigger(cls):
+        '''
+        TRIGGER_GEN: fire a trigger on the current tick (every radio sees it after its trigger delay).
+        Hardware times armed with set_hardware_time(..., on_trigger=True) are set, and the TX bursts waiting for it are sent.
+        Returns the trigger tick.
+        '''
+        with cls._radio_lock('trigger', 0):
+            tick = cls.now()
+            k = cls.trigger_count
+            cls._triggers[k % cls.TRIGGER_HISTORY] = tick
+            cls._state[3] = k + 1
+            n = cls.num_radios
+            for r in np.flatnonzero(~np.isnan(cls._armed_times[:n])):
+                cls._time_offsets[r] = cls.ticks(cls._armed_times[r]) - (tick + cls._trigger_delays[r])
+                cls._armed_times[r] = np.nan
+            pending, cls._pending = cls._pending, []
+        for count, chan_id, offset, vals in pending: cls.write(vals, chan_id, cls.trigger_tick(count, chan_id) + offset)
+        return tick
+    
+    def trigger_tick(cls, count, chan_id):
+        '''Tick at which chan_id saw trigger number count, or None if it hasn't fired yet.'''
+        if count >= cls.trigger_count: return None
+        return int(cls._triggers[count % cls.TRIGGER_HISTORY] + cls._trigger_delays[chan_id])
+    
+    def wait_trigger(cls, count, chan_id, timeoutUs):
+        '''Wait (up to timeoutUs, for another thread or process) for trigger number count, and return trigger_tick(), or None on timeout.'''
+        deadline = time.time() + timeoutUs/1e6
+        tick = cls.trigger_tick(count, chan_id)
+        while tick is None and time.time() < deadline:
+            time.sleep(min(.001, max(deadline - time.time(), 0)))
+            tick = cls.trigger_tick(count, chan_id)
+        return tick
+    
+    def trigger_write(cls, vals, chan_id, count, offset=0):
+        '''Transmit vals on chan_id offset ticks after it sees trigger number count, holding them until it fires.'''
+        with cls._radio_lock('trigger', 0):
+            tick = cls.trigger_tick(count, chan_id)
+            if tick is None: cls._pending.append((count, chan_id, offset, np.array(vals, dtype=np.complex64))) #the caller may reuse its buffer
+        if tick is not None: cls.write(vals, chan_id, tick + offset)
+        
+    def set_replay(cls, chan_id, samps=None):
+        '''Continuously transmit samps (up to REPLAY_SIZE, repeating from tick 0) on chan_id, on top of any streamed samples.  None stops it.'''
+        n = 0 if samps is None else len(samps)
+        if n > cls.REPLAY_SIZE: raise ValueError("Replay is limited to %d samples" % cls.REPLAY_SIZE)
+        with cls._radio_lock('tx', chan_id):
+            if n: cls._replay[chan_id, :n] = clip(np.array(samps, dtype=np.complex64))
+            cls._replay_lens[chan_id] = n
+            cls._versions[chan_id] += 1
+            cls._replay_versions[chan_id] += 1
+        
+    def tx_window(cls, chan_id, start, num, stream=True, replay=True):
+        '''
+        Return the TX samples of chan_id for ticks [start, start+num), with zeros wherever nothing is buffered.  
+        stream=False leaves out the written samples, and replay=False the TX_REPLAY waveform.
+        '''
+        out = np.zeros(num, dtype=np.complex64)
+        with cls._radio_lock('tx', chan_id):
+            head = cls._heads[chan_id]
+            lo = max(start, head - cls._bufsize)
+            hi = min(start + num, head)
+            if stream and hi > lo: _ring_get(cls._bufs[chan_id], lo, out[lo-start:hi-start])
+            n = cls._replay_lens[chan_id] if replay else 0
+            rep = cls._replay[chan_id, :n]*np.complex64(10**(cls.tx_gains[chan_id]/20)) if n else None #the replay follows the current TX gain
+        if n: _add_periodic(out, rep, start)
+        return out
+        
+    def _replay_response(cls, m, rx):
+        '''
+        One period of the response (before CFO, like ChannelMatrix.filter) of RX rx to every TX_REPLAY waveform, which repeats with 
+        the lcm of the replay lengths.  It is cached in the matrix row, and only recomputed once a replay or TX gain changes.
+        '''
+        row = m.row(rx)
+        txs = [t for t in row.txs if cls._replay_lens[t]]
+        period = math.lcm(*[int(cls._replay_lens[t]) for t in txs]) if txs else 1
+        key = (period, tuple((t, int(cls._replay_versions[t]), float(cls.tx_gains[t])) for t in txs))
+        if row.replay is not None and row.replay[0] == key: return row.replay[1]
+        if txs:
+            x = np.stack([cls.tx_window(t, -m.max_lag, period + m.max_lag, stream=False) for t in txs])
+            y = m.filter(m.spectra(x), txs, period, [rx])[:, 0]
+        else: y = np.zeros((2, 1), dtype=np.complex64)
+        row.replay = (key, y)
+        return y
         
-    def read(cls, num, chan_id):
-        out = np.zeros(num,dtype=np.complex64)
-        for i , (c,b) in enumerate(zip(cls._channels[chan_id],cls._bufs)):  #channelize and sum all buffers
-            if i != chan_id: out += c.channelize(b[:num])  #assume you can't rx your own tx
-        out *= 10**(cls.rx_gains[chan_id]/20) #apply rx gain
-        out.real *= cls._channels[chan_id][chan_id].iq_imbal_rx #apply iq imbalance -- we just do real, but it can be more or less than 1, so result is fine #apply here so that gains don't affect it.
-        out += cls._channels[chan_id][chan_id].dc_rx #apply dc #typically happens after amplification
+    def read(cls, num, chan_id, tick=None):
+        '''Receive num samples on chan_id starting at tick (default: the current emulated time).'''
+        return cls.read_many(num, [chan_id], tick)[0]
+    
+    def read_many(cls, num, chan_ids, tick=None, out=None):
+        '''Receive num samples on each of chan_ids starting at tick (default: the current emulated time).  Returns (len(chan_ids) x num), in out if given.'''
+        cls._sync()
+        if tick is None: tick = cls.now()
+        with ExitStack() as stack:
+            for c in sorted(set(chan_ids)): stack.enter_context(cls._radio_lock('rx', c)) #in order, so concurrent reads can't deadlock
+            out = cls._read_locked(num, chan_ids, tick, out)
+        with cls._radio_lock('clock', 0): cls.time = max(cls.time, tick + num)
+        return out
+    
+    def _read_locked(cls, num, chan_ids, tick, out=None):
+        if out is None: out = np.empty((len(chan_ids), num), dtype=np.complex64)
+        loop_ids = list(range(len(chan_ids)))
+        if cls.engine == 'batched':
+            with cls._matrix_lock:
+                if cls._matrix is None: cls._matrix = ChannelMatrix(cls.channel, cls.num_radios, seed=None if cls.seed is None else np.random.SeedSequence(cls.seed, spawn_key=(cls.num_radios,)), table_row=cls._scenario_row)
+                m = cls._matrix = cls._matrix.with_rows(chan_ids)
+            loop_ids = [i for i,c in enumerate(chan_ids) if not m.row(c).uniform_cfo]
+            batch_ids = [i for i,c in enumerate(chan_ids) if m.row(c).uniform_cfo]
+            if batch_ids:
+                txs = sorted(set(t for i in batch_ids for t in m.row(chan_ids[i]).txs))
+                periods = [int(cls._replay_lens[t]) for t in txs if cls._replay_lens[t]]
+                periodic = bool(periods) and math.lcm(*periods) <= cls.REPLAY_CACHE_SIZE #the replays go through cached responses, and only streamed samples are channelized
+                if periodic:
+                    start = tick - m.max_lag
+                    txs = [t for t in txs if cls._heads[t] > start and cls._heads[t] - cls._bufsize < tick + num] #the others have nothing streamed in this window
+                key = (tick, num, cls._versions[:cls.num_radios].tobytes(), m.nfft, m.max_lag, txs, periodic) #a longer channel can raise max_lag (the overlap) without changing nfft
+                spectra = cls._spectra #one reference, another thread may replace it
+                if spectra is None or spectra[0] != key:
+                    x = np.stack([cls.tx_window(t, tick - m.max_lag, num + m.max_lag, replay=not periodic) for t in txs]) if txs else np.zeros((0, num + m.max_lag), dtype=np.complex64)
+                    spectra = cls._spectra = (key, m.spectra(x))
+                extra = np.stack([_add_periodic(np.zeros((2, num), dtype=np.complex64), cls._replay_response(m, chan_ids[i]), tick) for i in batch_ids], axis=1) if periodic else None
+                rx_ids = [chan_ids[i] for i in batch_ids]
+                if len(batch_ids) == len(chan_ids): m.channelize(spectra[1], txs, num, rx_ids, tick, extra, out=out) #straight into the caller's buffer
+                else: out[batch_ids] = m.channelize(spectra[1], txs, num, rx_ids, tick, extra)
+                for j in batch_ids:
+                    for i,c in m.row(chan_ids[j]).varying: out[j] += c.channelize(cls.tx_window(i, tick - c.max_lag, num + c.max_lag), hist=c.max_lag, tick=tick)
+        out[loop_ids] = 0
+        for j in loop_ids:
+            for i in range(cls.num_radios):  #channelize and sum all buffers
+                c = cls.channel(chan_ids[j], i)
+                if i != chan_ids[j] and c is not None: out[j] += c.channelize(cls.tx_window(i, tick - c.max_lag, num + c.max_lag), hist=c.max_lag, tick=tick)  #assume you can't rx your own tx
+        for j,chan_id in enumerate(chan_ids):
+            out[j] *= 10**(cls.rx_gains[chan_id]/20) #apply rx gain
+            out[j].real *= cls.channel(chan_id, chan_id).iq_imbal_rx #apply iq imbalance -- we just do real, but it can be more or less than 1, so result is fine #apply here so that gains don't affect it.
+            out[j] += cls.channel(chan_id, chan_id).dc_rx #apply dc #typically happens after amplification
         return clip(out) #clip after RX gain.  The rx gain doesn't do much in this sim, since it scales everything.  We may need to add another noise stage or quantization lower bound to be more realistic.
     
-    def write(cls, vals, chan_id):
-        cls._bufs[chan_id][:vals.shape[0]] = clip(vals)*10**(cls.tx_gains[chan_id]/20) #clip before TX gain
+    def write(cls, vals, chan_id, tick=None):
+        '''Transmit vals on chan_id starting at tick (default: the current emulated time).'''
+        if tick is None: tick = cls.now()
+        with cls._radio_lock('tx', chan_id):
+            head = int(cls._heads[chan_id])
+            lo = max(tick, head - cls._bufsize, tick + vals.shape[0] - cls._bufsize) #anything older has already left the ring
+            hi = tick + vals.shape[0]
+            if hi <= lo: return
+            if lo > head: _ring_put(cls._bufs[chan_id], max(head, hi - cls._bufsize), np.zeros(lo - max(head, hi - cls._bufsize), dtype=np.complex64)) #silence between bursts
+            _ring_put(cls._bufs[chan_id], lo, clip(vals[lo-tick:].astype(np.complex64))*10**(cls.tx_gains[chan_id]/20)) #clip before TX gain
+            cls._heads[chan_id] = max(head, hi)
+            cls._versions[chan_id] += 1
         
     def reset(cls):
-        for buf in cls._bufs:
-            buf[:] = 0
+        '''Clear every TX buffer, pending burst, and TX_REPLAY, and restart the clock.'''
+        with cls._all_tx_locks():
+            cls._bufs[:] = 0
+            cls._heads[:] = 0
+            cls._replay_lens[:] = 0 #stop every replay
+            cls._replay_versions += 1
+            cls._versions += 1
+            cls.time = 0
+            cls.set_timebase(cls.timebase)
+            cls._spectra = None
+            cls._pending = []
+
+class ArgInfo:
+    '''Stand-in for SoapySDR.ArgInfo, e.g., from getSensorInfo().'''
+    def __init__(self, key, name='', units='', description='', value=''):
+        self.key = key
+        self.name = name
+        self.units = units
+        self.description = description
+        self.value = value
 
 class StreamReturn:
     ''' Simple class to mimic stream status return syntax. '''
-    def __init__(self, ret):
+    def __init__(self, ret, flags=0, timeNs=0):
         self.ret = ret
+        self.flags = flags
+        self.timeNs = timeNs
 
 class Device:
     ''' 
     Oversimplified virtual SoapySDR device to simply read/write stream operations.
-    It has no notion of rate or timestamps, and doesn't mimic functionality, just syntax.
+    Streams follow the ChanEmu sample clock and timestamps, but otherwise it doesn't mimic functionality, just syntax.
+    Like SoapySDR.Device, a list of args makes a list of devices, and their radios are added to the ChanEmu in one go.
     '''
     
-    _NEXT_CHAN = 0 #keep unique device identifiers for the channel emulation
     _TX_GAIN_RANGE = [-50,50]
     _RX_GAIN_RANGE = [-50,50]
     
+    #modeled sensors: name, units, and temperature at power up and after warming up
+    _SENSORS = {'ZYNQ_TEMP' : ('ZYNQ Temperature', 'C', 40, 62),
+                'LMS7_TEMP' : ('LMS7 Temperature', 'C', 35, 50),
+                'FE_RX_TEMP' : ('Frontend RX Temperature', 'C', 30, 41),
+                'FE_TX_TEMP' : ('Frontend TX Temperature', 'C', 30, 45)}
+    _WARMUP = 300 #seconds (time constant)
+    
+    def __new__(cls, *argv, num_chan=2):
+        if argv and isinstance(argv[0], (list, tuple)):
+            chan_ids = ChanEmu().open_radios([args.get('serial', '') for args in argv[0]], num_chan)
+            devices = [super(Device, cls).__new__(cls) for args in argv[0]] #not instances of the list, so __init__ isn't called on it
+            for dev,args,ids in zip(devices, argv[0], chan_ids): dev._open(args, num_chan, ids)
+            return devices
+        return super(Device, cls).__new__(cls)
+    
     def __init__(self, *argv, num_chan=2):
-        #to replicate this properly, we should be able to take a list of args in and return a list of devices.
+        self._open(argv[0], num_chan, ChanEmu().open_radio(argv[0].get('serial', ''), num_chan)) #add these channels to the channel emulator (unless this serial is already there)
+        
+    def _open(self, args, num_chan, chan_ids):
         self.rate = None
         self.freq = None
         self.bandwidth = None
         self.chan_em = ChanEmu()
         self.num_chan = num_chan
-        self.chan_ids = range(self._NEXT_CHAN,self._NEXT_CHAN+num_chan) 
-        Device._NEXT_CHAN += num_chan #this will increment the chan_ids for the next instance
-        for i in range(num_chan): self.chan_em.add_chan() #add these channels to the channel emulator
-        self.serial = argv[0]['serial'] + '-SIM' if 'serial' in argv[0] else 'NoSerial-SIM'
+        self.chan_ids = chan_ids
+        self._regs = {'TX_RAM_A' : np.zeros(ChanEmu.REPLAY_SIZE, dtype=np.uint32), 'TX_RAM_B' : np.zeros(ChanEmu.REPLAY_SIZE, dtype=np.uint32)} #register interface -> address -> value
+        self._settings = {}
+        self._power_up = time.time()
+        self._sensor_offset = np.random.default_rng(list(args.get('serial', '').encode())).normal(scale=2) #every board runs a little differently
+        self.serial = args['serial'] + '-SIM' if 'serial' in args else 'NoSerial-SIM'
         self.hw_info = { 'driver' : '2020.11.0.1-f0f0f0',
                          'firmware' : '2020.11.0.1-f0f0f0',
                          'fpga' : '2020.11.0.1-f0f0f0',
@@ -230,6 +1623,7 @@ class Device:
         return self.rate
     def setSampleRate(self, direction, channel, rate):
         self.rate = rate
+        self.chan_em.set_rate(rate) #there is only one emulated air, so the last rate set wins
     def getBandwidth(self, direction, channel):
         return self.bandwidth
     def setBandwidth(self, direction, channel, bw):
@@ -266,35 +1660,75 @@ class Device:
         return
     def getHardwareInfo(self, *argv, **kwargs):
         return self.hw_info
-    def setupStream(self, direction, packing_form, channels, kwargs):
-        return Stream([self.chan_ids[i] for i in channels])
-    def activateStream(self, *argv, **kwargs):
-        return
+    def setupStream(self, direction, packing_form, channels, kwargs={}):
+        mtu = kwargs.get('mtu') #samples per read or write, unlimited by default
+        return Stream([self.chan_ids[i] for i in channels], packing_form, direction, int(mtu) if mtu is not None else None)
+    def activateStream(self, stream, flags=0, timeNs=0, numElems=0):
+        stream.activate(flags, timeNs, numElems)
+        return 0
     #these can be static...
     def writeStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):            
         return stream.write(stream, buffs, numElems, flags, timeNs, timeoutUs)
     def readStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
         return stream.read(stream, buffs, numElems, flags, timeNs, timeoutUs)
-    def deactivateStream(self, *argv, **kwargs):
-        return
+    def deactivateStream(self, stream, flags=0, timeNs=0):
+        stream.deactivate(flags, timeNs)
+        return 0
     def closeStream(self, *argv, **kwargs):
         return
     def readSetting(self, *argv, **kwargs):
-        return
+        '''readSetting(key) or readSetting(direction, channel, key).'''
+        return self._settings.get(tuple(argv), "")
     def writeSetting(self, *argv, **kwargs):
-        return
+        '''writeSetting(key, value) or writeSetting(direction, channel, key, value).'''
+        key, value = argv[-2], argv[-1]
+        self._settings[tuple(argv[:-1])] = value
+        if key == 'TRIGGER_GEN': #every radio in the emulation is on the same trigger chain
+            self.chan_em.trigger()
+        elif key == 'SYNC_DELAYS':
+            self.chan_em.sync_delays()
+        elif key == 'TX_REPLAY': #replay the start of TX_RAM_A/B, or stop if empty
+            for ram,chan_id in zip(['TX_RAM_A', 'TX_RAM_B'], self.chan_ids):
+                self.chan_em.set_replay(chan_id, self._uint32ToCfloat(self._regs[ram][:int(value)]) if value else None)
     def readRegister(self, *argv, **kwargs):
-        return
+        '''readRegister(addr) or readRegister(name, addr).'''
+        return self.readRegisters(*(argv[:-1] + (argv[-1], 1)))[0]
     def writeRegister(self, *argv, **kwargs):
-        return
-    def getHardwareTime(self, *argv, **kwargs):
-        return 0
-    def setHardwareTime(self, *argv, **kwargs):
-        return
+        '''writeRegister(addr, value) or writeRegister(name, addr, value).'''
+        self.writeRegisters(*(argv[:-1] + ([argv[-1]],)))
+    def readRegisters(self, *argv, **kwargs):
+        '''readRegisters(name, addr, length).  RX_SNOOPER returns the latest samples of a channel (addr), I in the low 16 bits.'''
+        name, addr, length = argv if len(argv) == 3 else ('',) + argv
+        if name == 'RX_SNOOPER':
+            samps = self.chan_em.read(length, self.chan_ids[addr], self.chan_em.now() - length) #the samples up to now, so polling doesn't move the clock
+            return quantize(samps, np.empty(length, dtype=np.uint32)) #np.uint32 rather than a list of ints, so np.int16(s & 0xffff) still wraps with numpy 2
+        regs = self._regs.get(name, {})
+        if isinstance(regs, np.ndarray): return regs[addr:addr+length].tolist()
+        return [regs.get(a, 0) for a in range(addr, addr+length)]
+    def writeRegisters(self, *argv, **kwargs):
+        '''writeRegisters(name, addr, values), e.g., TX_RAM_A/B for TX_REPLAY (I in the high 16 bits).'''
+        name, addr, values = argv if len(argv) == 3 else ('',) + argv
+        regs = self._regs.setdefault(name, {})
+        if isinstance(regs, np.ndarray): regs[addr:addr+len(values)] = values
+        else: regs.update(zip(range(addr, addr+len(values)), values))
+    @staticmethod
+    def _uint32ToCfloat(arr):
+        arr = np.asarray(arr, dtype=np.uint32)
+        return ((arr >> 16).astype(np.uint16).view(np.int16) + 1j*(arr & 0xffff).astype(np.uint16).view(np.int16)).astype(np.complex64)/32768
+    def getHardwareTime(self, what=""):
+        '''Hardware time (ns) of this radio, which runs with the emulated sample clock.'''
+        return self.chan_em.hardware_time(self.chan_ids[0])
+    def setHardwareTime(self, timeNs, what=""):
+        '''Set the hardware time now, or on the next trigger if what is "TRIGGER".'''
+        for chan_id in self.chan_ids: self.chan_em.set_hardware_time(chan_id, timeNs, what == "TRIGGER")
     def listSensors(self, *argv, **kwargs):
-        return
+        return list(self._SENSORS)
     def readSensor(self, *argv, **kwargs):
-        return
+        '''readSensor(key) or readSensor(direction, channel, key).  Temperatures warm up from power up, plus a little noise.'''
+        name, units, cold, warm = self._SENSORS[argv[-1]]
+        warm += 3*np.sum(self.chan_em._replay_lens[self.chan_ids] > 0) #replaying keeps the radio busy
+        temp = warm - (warm - cold)*np.exp(-(time.time() - self._power_up)/self._WARMUP) + self._sensor_offset + np.random.normal(scale=.2)
+        return '%.2f' % temp
 
     #generated using:
     #method_list = [func for func in dir(SoapySDR.Device) if callable(getattr(SoapySDR.Device, func))]
@@ -304,10 +1738,12 @@ class Device:
     #for m in method_list:
     #    inspect.getfullargspec(getattr(SoapySDR.Device,m)) #doesn't work because of the way SWIG bindings are set apparently
 
-    def acquireReadBuffer(self, *argv, **kwargs):
-        return
-    def acquireWriteBuffer(self, *argv, **kwargs):
-        return
+    def acquireReadBuffer(self, stream, timeoutUs=int(1e5)):
+        '''Returns a StreamReturn, with handle and buffs (numpy views) on success.  Call releaseReadBuffer when done with them.'''
+        return stream.acquire_read(timeoutUs)
+    def acquireWriteBuffer(self, stream, timeoutUs=int(1e5)):
+        '''Returns a StreamReturn (ret is the size of the buffers), with handle and buffs to fill before releaseWriteBuffer.'''
+        return stream.acquire_write(timeoutUs)
     def close(self, *argv, **kwargs):
         return
     def getBandwidthRange(self, *argv, **kwargs):
@@ -318,8 +1754,8 @@ class Device:
         return
     def getDCOffset(self, *argv, **kwargs):
         return
-    def getDirectAccessBufferAddrs(self, *argv, **kwargs):
-        return
+    def getDirectAccessBufferAddrs(self, stream, handle):
+        return stream.buffer_addrs(handle)
     def getDriverKey(self, *argv, **kwargs):
         return
     def getFrequencyArgsInfo(self, *argv, **kwargs):
@@ -346,20 +1782,21 @@ class Device:
         return
     def getNumChannels(self, *argv, **kwargs):
         return
-    def getNumDirectAccessBuffers(self, *argv, **kwargs):
-        return
+    def getNumDirectAccessBuffers(self, stream):
+        return stream.NUM_DIRECT_BUFFERS
     def getSampleRateRange(self, *argv, **kwargs):
         return
     def getSensorInfo(self, *argv, **kwargs):
-        return
+        name, units, cold, warm = self._SENSORS[argv[-1]]
+        return ArgInfo(argv[-1], name, units)
     def getSettingInfo(self, *argv, **kwargs):
         return
     def getStreamArgsInfo(self, *argv, **kwargs):
         return
     def getStreamFormats(self, *argv, **kwargs):
         return
-    def getStreamMTU(self, *argv, **kwargs):
-        return
+    def getStreamMTU(self, stream):
+        return stream.mtu
     def getTimeSource(self, *argv, **kwargs):
         return
     def hasDCOffset(self, *argv, **kwargs):
@@ -371,7 +1808,7 @@ class Device:
     def hasGainMode(self, *argv, **kwargs):
         return
     def hasHardwareTime(self, *argv, **kwargs):
-        return
+        return True
     def hasIQBalance(self, *argv, **kwargs):
         return
     def listAntennas(self, *argv, **kwargs):
@@ -402,8 +1839,6 @@ class Device:
         return
     def readI2C(self, *argv, **kwargs):
         return
-    def readRegisters(self, *argv, **kwargs):
-        return
     def readSensorBool(self, *argv, **kwargs):
         return
     def readSensorFloat(self, *argv, **kwargs):
@@ -416,18 +1851,18 @@ class Device:
         return
     def readSettingInt(self, *argv, **kwargs):
         return
-    def readStreamStatus(self, *argv, **kwargs):
-        return
+    def readStreamStatus(self, stream, timeoutUs=int(1e5)):
+        return stream.read_status(timeoutUs)
     def readStreamStatus__(self, *argv, **kwargs):
         return
     def readStream__(self, *argv, **kwargs):
         return
     def readUART(self, *argv, **kwargs):
         return
-    def releaseReadBuffer(self, *argv, **kwargs):
-        return
-    def releaseWriteBuffer(self, *argv, **kwargs):
-        return
+    def releaseReadBuffer(self, stream, handle):
+        stream.release(handle)
+    def releaseWriteBuffer(self, stream, handle, numElems, flags=0, timeNs=0):
+        return stream.release_write(handle, numElems, flags, timeNs)
     def setClockSource(self, *argv, **kwargs):
         return
     def setCommandTime(self, *argv, **kwargs):
@@ -456,7 +1891,5 @@ class Device:
         return
     def writeI2C(self, *argv, **kwargs):
         return
-    def writeRegisters(self, *argv, **kwargs):
-        return
     def writeUART(self, *argv, **kwargs):
         return
@@ -0,0 +1,430 @@
+#!/usr/bin/python
+#
+#	Local network stand-in for SoapyRemote, serving SoapySDRVirt (ChanEmu) devices over TCP or UDP.
+#
+#	Start a server, then use this module in place of SoapySDR in the client:
+#		python SoapyVirtRemote.py --bind 127.0.0.1:55132
+#
+#		import SoapyVirtRemote as SoapySDR
+#		sdr = SoapySDR.Device(dict(remote="127.0.0.1:55132", serial="RF3E000001"))
+#		rxStream = sdr.setupStream(SOAPY_SDR_RX, SOAPY_SDR_CF32, [0, 1], {"remote:prot":"udp", "remote:mtu":"1500"})
+#
+#	Device calls go over a control connection, and every stream gets its own data socket (TCP or UDP).
+#	Samples are sent in the stream format, packetized to fit "remote:mtu" (like SoapyRemote, the MTU includes the
+#	IP/UDP headers), and "remote:window" sets the socket buffers, so packetization overhead, MTU choices,
+#	and socket buffer drain behavior can be measured on one box.
+#	RX is flow controlled by credits: readStream asks the server for the samples it still needs, and the
+#	server reads them from the emulator and sends them, so streaming follows the emulated clock like a local Device.
+#	With UDP, credits are limited to what should fit in the receive socket buffer (like SoapyRemote's flow control
+#	window), and datagrams dropped anyway show up as SOAPY_SDR_OVERFLOW.
+#
+#	The control connection pickles its calls, so anyone who can connect can run code on the server.  The server only
+#	binds to loopback unless it has an authkey (the SOAPY_VIRT_AUTHKEY environment variable, or --authkey-file),
+#	and clients use the same one:
+#		SOAPY_VIRT_AUTHKEY=secret python SoapyVirtRemote.py --bind 0.0.0.0:55132
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#	INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#	PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+#	FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#	OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#	DEALINGS IN THE SOFTWARE.
+#
+#	(c) 2026 info@skylarkwireless.com
+
+from argparse import ArgumentParser
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+import ipaddress
+import numpy as np
+import os
+import socket
+import struct
+import threading
+import time
+import SoapySDRVirt
+from SoapySDRVirt import * #constants, so this module can be imported as SoapySDR
+from SoapySDRVirt import _FORMAT_BYTES
+
+DEFAULT_PORT = 55132 #same as SoapyRemote
+_HEADER = struct.Struct('<iIqQ') #flags, numElems, timeNs, index of the first element in the stream
+_CREDIT = struct.Struct('<q') #RX: elements requested (negative to stop), TX: elements received
+_IP_UDP_OVERHEAD = 28
+AUTHKEY_ENV = 'SOAPY_VIRT_AUTHKEY' #authkey of the control connection, if none is passed
+
+def _parseAddress(addr, default_port=DEFAULT_PORT):
+    '''"host:port" (optionally with a tcp:// or udp:// prefix) to (host, port).'''
+    addr = addr.split('://')[-1]
+    host, _, port = addr.rpartition(':') if ':' in addr else (addr, '', '')
+    return (host or '127.0.0.1', int(port) if port else default_port)
+
+def _authkey(authkey=None):
+    '''The authkey given, or else the one in the AUTHKEY_ENV environment variable (None if neither).'''
+    if authkey is None: authkey = os.environ.get(AUTHKEY_ENV) or None
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+def _isLoopback(host):
+    try: return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (socket.gaierror, ValueError): return False
+
+def _recvExact(sock, view):
+    '''Fill the memoryview from a stream socket.'''
+    got = 0
+    while got < len(view):
+        n = sock.recv_into(view[got:])
+        if n == 0: raise ConnectionError("Connection closed")
+        got += n
+
+def _setWindow(sock, window):
+    if window:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, window)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, window)
+
+class _StreamRef:
+    '''Stands in for a stream in the arguments of a remote call.'''
+    def __init__(self, sid):
+        self.sid = sid
+
+class _StreamLink:
+    '''
+    Packet framing shared by both ends of a stream's data socket.
+    Every packet is a header plus numElems elements of each channel, one channel after the other.
+    '''
+    def __init__(self, sock, prot, fmt, num_chans, mtu):
+        self.sock = sock
+        self.prot = prot
+        self.fmt = fmt
+        self.num_chans = num_chans
+        self.elem_bytes = _FORMAT_BYTES[fmt]
+        self.elems_per_packet = max(1, (mtu - _IP_UDP_OVERHEAD - _HEADER.size)//(self.elem_bytes*num_chans))
+        self.packet_size = _HEADER.size + self.elems_per_packet*self.elem_bytes*num_chans
+        self._rx = bytearray(self.packet_size)
+
+    def send(self, buffs, offset, num, flags, timeNs, index):
+        '''Send elements [offset, offset+num) of every buffer as one packet (scatter/gather, without copying).'''
+        b = self.elem_bytes
+        parts = [_HEADER.pack(flags, num, timeNs, index)] + [memoryview(buff).cast('B')[offset*b:(offset+num)*b] for buff in buffs]
+        self.sock.sendmsg(parts)
+
+    def recv(self):
+        '''Receive one packet: (flags, numElems, timeNs, index, [payload of every channel]).'''
+        mv = memoryview(self._rx)
+        if self.prot == 'udp':
+            n = self.sock.recv_into(mv)
+            if n < _HEADER.size: raise ConnectionError("Short packet")
+        else:
+            _recvExact(self.sock, mv[:_HEADER.size])
+        flags, num, timeNs, index = _HEADER.unpack_from(mv)
+        size = num*self.elem_bytes
+        if self.prot != 'udp': _recvExact(self.sock, mv[_HEADER.size:_HEADER.size + size*self.num_chans])
+        return flags, num, timeNs, index, [mv[_HEADER.size + i*size:_HEADER.size + (i+1)*size] for i in range(self.num_chans)]
+
+class Server:
+    '''
+    Serves SoapySDRVirt devices to remote clients.  Every client connection opens its own Device (by its args,
+    so a known serial maps to the same emulated radio), and every stream it sets up gets a data socket.
+    Calls into the emulator are serialized by one lock.
+    Without an authkey (or AUTHKEY_ENV) set, only loopback addresses are served, as the control connection is pickled.
+    '''
+    def __init__(self, address=('127.0.0.1', DEFAULT_PORT), authkey=None):
+        authkey = _authkey(authkey)
+        if authkey is None and not _isLoopback(address[0]): 
+            raise ValueError("Serving on %r needs an authkey (set %s, or pass --authkey-file), anyone who can connect could run code" % (address[0], AUTHKEY_ENV))
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.lock = threading.RLock()
+        self._threads = []
+
+    def serve_forever(self):
+        while True:
+            try: conn = self.listener.accept()
+            except AuthenticationError: continue #a client with the wrong authkey
+            except OSError: return #closed
+            t = threading.Thread(target=self._serveClient, args=(conn,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def start(self):
+        '''Serve from a background thread.'''
+        t = threading.Thread(target=self.serve_forever, daemon=True)
+        t.start()
+        return self
+
+    def close(self):
+        self.listener.close()
+
+    def _serveClient(self, conn):
+        dev = None
+        streams = {}
+        try:
+            while True:
+                method, args, kwargs = conn.recv()
+                try:
+                    if method == 'closeStream':
+                        streams.pop(args[0].sid)[1].close()
+                        conn.send((True, None))
+                        continue
+                    args = [streams[a.sid][0] if isinstance(a, _StreamRef) else a for a in args]
+                    if method == 'make':
+                        with self.lock: dev = SoapySDRVirt.Device(*args, **kwargs)
+                        result = None
+                    elif method == 'setupStream':
+                        result = self._setupStream(dev, streams, *args)
+                    elif method == 'unmake':
+                        conn.send((True, None))
+                        break
+                    else:
+                        with self.lock: result = getattr(dev, method)(*args, **kwargs)
+                    conn.send((True, result))
+                except Exception as ex:
+                    conn.send((False, ex))
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            for stream,sock in streams.values(): sock.close()
+            conn.close()
+
+    def _setupStream(self, dev, streams, direction, fmt, channels, kwargs={}):
+        prot = kwargs.get('remote:prot', 'udp')
+        mtu = int(kwargs.get('remote:mtu', 1500))
+        window = int(kwargs.get('remote:window', 0))
+        with self.lock: stream = dev.setupStream(direction, fmt, channels, kwargs)
+        host = self.address[0] if isinstance(self.address, tuple) else '127.0.0.1'
+        if prot == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _setWindow(sock, window)
+            sock.bind((host, 0))
+            listen = None
+        else:
+            listen = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listen.bind((host, 0))
+            listen.listen(1)
+            sock = listen
+        sid = len(streams)
+        while sid in streams: sid += 1
+        streams[sid] = (stream, sock)
+        port = sock.getsockname()[1]
+        target = self._rxLoop if direction == SOAPY_SDR_RX else self._txLoop
+        threading.Thread(target=self._streamThread, args=(target, dev, stream, sock, listen, prot, fmt, len(channels), mtu, window), daemon=True).start()
+        return (sid, port)
+
+    def _streamThread(self, target, dev, stream, sock, listen, prot, fmt, num_chans, mtu, window):
+        try:
+            if listen is not None:
+                sock, addr = listen.accept()
+                listen.close()
+                _setWindow(sock, window)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            else:
+                hello, addr = sock.recvfrom(_CREDIT.size)
+                sock.connect(addr)
+            target(dev, stream, _StreamLink(sock, prot, fmt, num_chans, mtu))
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            sock.close()
+
+    def _rxLoop(self, dev, stream, link):
+        buffs = [formatBuffer(link.fmt, 0) for i in range(link.num_chans)]
+        index = 0
+        credit = bytearray(_CREDIT.size)
+        while True:
+            _recvExact(link.sock, memoryview(credit)) if link.prot != 'udp' else link.sock.recv_into(credit)
+            num = _CREDIT.unpack(credit)[0]
+            if num < 0: return
+            if num == 0: continue
+            if len(buffs[0]) < num*link.elem_bytes//buffs[0].itemsize: buffs = [formatBuffer(link.fmt, num) for i in range(link.num_chans)]
+            with self.lock: sr = dev.readStream(stream, buffs, num)
+            if sr.ret <= 0:
+                link.send(buffs, 0, 0, sr.ret, 0, index) #errors are sent as an empty packet with the code in flags
+                continue
+            rate = dev.chan_em.rate
+            for offset in range(0, sr.ret, link.elems_per_packet):
+                n = min(link.elems_per_packet, sr.ret - offset)
+                timeNs = sr.timeNs + int(round(ticksToTimeNs(offset, rate)))
+                link.send(buffs, offset, n, sr.flags, timeNs, index)
+                index += n
+
+    def _txLoop(self, dev, stream, link):
+        index = 0
+        received = 0
+        error = 0
+        while True:
+            flags, num, timeNs, pkt_index, payload = link.recv()
+            if flags < 0: return
+            if pkt_index != index: error = SOAPY_SDR_UNDERFLOW #datagrams were dropped
+            bufs = [np.frombuffer(p, dtype=np.uint8).view(formatBuffer(link.fmt, 0).dtype) for p in payload]
+            per = bufs[0].shape[0]//num if num else 1 #array items per element
+            done = 0
+            while done < num and not error: #the stream's own MTU may split the packet
+                with self.lock: sr = dev.writeStream(stream, [b[done*per:] for b in bufs], num - done, (flags if done == 0 else flags & ~SOAPY_SDR_HAS_TIME) & ~SOAPY_SDR_MORE_FRAGMENTS, timeNs)
+                if sr.ret <= 0: error = sr.ret or SOAPY_SDR_TIMEOUT
+                else: done += sr.ret
+            index = pkt_index + num
+            received += done
+            if not flags & SOAPY_SDR_MORE_FRAGMENTS: #end of one writeStream call
+                link.sock.send(_CREDIT.pack(error or received))
+                received = 0
+                error = 0
+
+class RemoteStream:
+    '''Client end of a stream: the data socket and whatever is left of the last RX packet.'''
+    def __init__(self, sid, link, direction):
+        self.sid = sid
+        self.link = link
+        self.direction = direction
+        self.index = 0 #next element expected (RX) or sent (TX)
+        self.requested = 0 #RX elements asked for so far
+        self.pending = None #RX packet not fully read yet: (flags, timeNs, index, offset, num, payload)
+        self.overflow = False
+
+class Device:
+    '''
+    Client for a Server: a drop-in for SoapySDRVirt.Device (or a SoapySDR.Device with driver=remote), with args["remote"]
+    set to the server's "host:port".  Everything except the stream data is forwarded over the control connection.
+    authkey (default: AUTHKEY_ENV) has to match the server's.
+    '''
+    def __init__(self, args, authkey=None):
+        args = dict(args)
+        self._address = _parseAddress(args.pop('remote', '127.0.0.1'))
+        self._conn = Client(self._address, authkey=_authkey(authkey))
+        self._lock = threading.Lock()
+        self._call('make', args)
+
+    def _call(self, method, *args, **kwargs):
+        args = [_StreamRef(a.sid) if isinstance(a, RemoteStream) else a for a in args]
+        with self._lock:
+            self._conn.send((method, args, kwargs))
+            ok, result = self._conn.recv()
+        if not ok: raise result #re-raise the server's exception
+        return result
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def setupStream(self, direction, packing_form, channels, kwargs={}):
+        prot = kwargs.get('remote:prot', 'udp')
+        if prot not in ['udp', 'tcp']: raise ValueError("remote:prot must be udp or tcp")
+        sid, port = self._call('setupStream', direction, packing_form, channels, kwargs)
+        if prot == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _setWindow(sock, int(kwargs.get('remote:window', 0)))
+            sock.connect((self._address[0], port))
+            sock.send(_CREDIT.pack(0)) #so the server knows where to send
+        else:
+            sock = socket.create_connection((self._address[0], port))
+            _setWindow(sock, int(kwargs.get('remote:window', 0)))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        link = _StreamLink(sock, prot, packing_form, len(channels), int(kwargs.get('remote:mtu', 1500)))
+        if prot == 'udp': #datagrams take a lot more of the socket buffer than their size, so leave plenty of room
+            link.window_elems = max(1, sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)//(2*link.packet_size + 4096))*link.elems_per_packet
+        else:
+            link.window_elems = None #TCP has its own flow control
+        return RemoteStream(sid, link, direction)
+
+    def closeStream(self, stream):
+        try: stream.link.sock.send(_CREDIT.pack(-1) if stream.direction == SOAPY_SDR_RX else _HEADER.pack(-1, 0, 0, 0))
+        except OSError: pass
+        stream.link.sock.close()
+        return self._call('closeStream', stream)
+
+    def getStreamMTU(self, stream):
+        return stream.link.elems_per_packet
+
+    def writeStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        '''Send numElems as MTU sized packets, then wait for the server to have written them to the emulator.'''
+        link = stream.link
+        buffs = [np.ascontiguousarray(b) for b in buffs]
+        for offset in range(0, numElems, link.elems_per_packet):
+            n = min(link.elems_per_packet, numElems - offset)
+            last = offset + n == numElems
+            pkt_flags = (flags if last else flags & ~SOAPY_SDR_END_BURST) | (0 if last else SOAPY_SDR_MORE_FRAGMENTS)
+            if offset > 0: pkt_flags &= ~SOAPY_SDR_HAS_TIME #only the first packet is timed
+            link.send(buffs, offset, n, pkt_flags, timeNs, stream.index)
+            stream.index += n
+        link.sock.settimeout(timeoutUs/1e6)
+        try:
+            ack = bytearray(_CREDIT.size)
+            _recvExact(link.sock, memoryview(ack)) if link.prot != 'udp' else link.sock.recv_into(ack)
+        except socket.timeout:
+            return StreamReturn(SOAPY_SDR_TIMEOUT)
+        return StreamReturn(_CREDIT.unpack(ack)[0], flags, timeNs) #elements written, or an error code
+
+    def readStream(self, stream, buffs, numElems, flags=0, timeNs=0, timeoutUs=int(1e6)):
+        '''Fill numElems of every buffer from the server, unless the timeout runs out first.'''
+        link = stream.link
+        dst = [memoryview(np.ascontiguousarray(b)).cast('B') for b in buffs]
+        b = link.elem_bytes
+        if stream.overflow:
+            stream.overflow = False
+            return StreamReturn(SOAPY_SDR_OVERFLOW)
+        deadline = time.time() + timeoutUs/1e6
+        filled = 0
+        ret_time = None
+        ret_flags = 0
+        while filled < numElems:
+            if stream.pending is None:
+                if stream.requested <= stream.index: #nothing in flight, ask for more
+                    ask = numElems - filled if link.window_elems is None else min(numElems - filled, link.window_elems)
+                    link.sock.send(_CREDIT.pack(ask))
+                    stream.requested = stream.index + ask
+                remaining = deadline - time.time()
+                if timeoutUs and remaining <= 0: break
+                link.sock.settimeout(remaining if timeoutUs else 0)
+                try: pkt_flags, num, pkt_time, index, payload = link.recv()
+                except (socket.timeout, BlockingIOError):
+                    if timeoutUs and link.prot == 'udp': stream.requested = stream.index #the rest was dropped, ask again next time
+                    break
+                if pkt_flags < 0 and num == 0: #an error instead of the samples, so the credit is void
+                    stream.requested = stream.index
+                    return StreamReturn(pkt_flags)
+                if index != stream.index: #dropped datagrams
+                    stream.index = index
+                    stream.pending = (pkt_flags, pkt_time, index, 0, num, [bytes(p) for p in payload])
+                    if filled: stream.overflow = True
+                    else: return StreamReturn(SOAPY_SDR_OVERFLOW)
+                    break
+                stream.pending = (pkt_flags, pkt_time, index, 0, num, payload)
+            pkt_flags, pkt_time, index, offset, num, payload = stream.pending
+            n = min(num - offset, numElems - filled)
+            if ret_time is None:
+                ret_time = pkt_time + int(round(ticksToTimeNs(offset, self._rate())))
+                ret_flags = pkt_flags & SOAPY_SDR_HAS_TIME
+            for d,p in zip(dst, payload): d[filled*b:(filled+n)*b] = p[offset*b:(offset+n)*b]
+            filled += n
+            stream.index += n
+            stream.pending = None if offset + n == num else (pkt_flags, pkt_time, index, offset + n, num, [bytes(p) for p in payload])
+        for buf,d in zip(buffs, dst):
+            if d.obj is not buf and not np.shares_memory(d.obj, buf): buf[:] = d.obj #non-contiguous buffers
+        if filled == 0: return StreamReturn(SOAPY_SDR_TIMEOUT)
+        return StreamReturn(filled, ret_flags, ret_time)
+
+    def _rate(self):
+        if not hasattr(self, '_sample_rate'): self._sample_rate = self._call('getSampleRate', SOAPY_SDR_RX, 0) or 1e6
+        return self._sample_rate
+
+    def setSampleRate(self, direction, channel, rate):
+        self._sample_rate = rate
+        return self._call('setSampleRate', direction, channel, rate)
+
+    def close(self):
+        try: self._call('unmake')
+        except (EOFError, OSError): pass
+        self._conn.close()
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--bind", type=str, dest="bind", help="Address to serve on (other than loopback needs an authkey)", default="127.0.0.1:%d" % DEFAULT_PORT)
+    parser.add_argument("--authkey-file", type=str, dest="authkey_file", help="File holding the authkey clients must use (default: the %s environment variable)" % AUTHKEY_ENV, default=None)
+    parser.add_argument("--rate", type=float, dest="rate", help="Emulated sample rate", default=1e6)
+    args = parser.parse_args()
+
+    authkey = None
+    if args.authkey_file is not None:
+        with open(args.authkey_file, 'rb') as f: authkey = f.read().strip()
+    SoapySDRVirt.ChanEmu(rate=args.rate)
+    server = Server(_parseAddress(args.bind), authkey)
+    print("Serving SoapySDRVirt devices on %s:%d" % server.address)
+    try: server.serve_forever()
+    except KeyboardInterrupt: server.close()
@@ -0,0 +1,397 @@
+#!/usr/bin/python
+#
+#	Benchmarks for the channel emulator (SoapySDRVirt) and related DSP.  None of these need hardware, e.g.:
+#		python benchmarks.py chanemu --radios 2 8 32 64
+#		python benchmarks.py noise --nsamps 1024 65536 1048576
+#		python benchmarks.py remote --mtus 1500 9000
+#		python benchmarks.py threads --threads 1 2 4 8 --radios 16
+#		python benchmarks.py direct --nsamps 1024 8192
+#		python benchmarks.py trigger --sleeps 0 1 10 100 --radios 4
+#		python benchmarks.py devices --radios 16 128
+#		python benchmarks.py capture --nsamps 1024 65536
+#		python benchmarks.py scenario --radios 16 64 --radius 8
+#		python benchmarks.py replay --radios 4 16 64 --nsamps 4096
+#		python benchmarks.py geometry --radios 16 64 256
+#		python benchmarks.py lts --nsamps 256 1024 4096 16384 65536 --upsample 1 2 4
+#		python benchmarks.py ltsarray --radios 8 64 --nsamps 2048 8192
+#		python benchmarks.py check
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#	INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#	PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+#	FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#	OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#	DEALINGS IN THE SOFTWARE.
+#
+#	(c) 2026 info@skylarkwireless.com
+
+from argparse import ArgumentParser
+import numpy as np
+import time
+import threading
+import os
+import tempfile
+import SoapySDRVirt
+import SoapyVirtRemote
+import SoapyCapture
+import lts
+
+def freshEmulator(**kwargs):
+    '''Drop the ChanEmu singleton so every run starts from an empty emulation.'''
+    SoapySDRVirt.ChanEmu().close()
+    return SoapySDRVirt.ChanEmu(**kwargs)
+
+def timeit(func, min_time=.5):
+    '''Return the mean time of one call to func, repeating for at least min_time seconds.'''
+    func() #warm up (e.g., build caches)
+    n = 0
+    t = time.time()
+    while time.time() - t < min_time or n < 3:
+        func()
+        n += 1
+    return (time.time() - t)/n
+
+def noiseStd(engine, num, nsamps, radius=None, noise=-20):
+    '''Noise (std per real dimension) that every RX radio reads with nothing transmitted, so the engines can be checked against each other.'''
+    chan_em = freshEmulator(engine=engine, coupling_radius=radius, seed=0, channel_args=dict(noise=noise, dc=0))
+    SoapySDRVirt.Device(dict(serial='bench'), num_chan=num)
+    return np.std(chan_em.read_many(nsamps, list(range(num)), 0).real, axis=-1).mean()
+
+def benchChanEmu(radios, nsamps, radius=None):
+    '''Time reading every RX radio for one window, with the per-pair loop and the batched engine (and check that they add the same noise).'''
+    print("%8s %14s %14s %10s %12s" % ("radios", "loop (ms)", "batched (ms)", "speedup", "noise ratio"))
+    for num in radios:
+        results = []
+        for engine in ['loop', 'batched']:
+            chan_em = freshEmulator(engine=engine, coupling_radius=radius)
+            SoapySDRVirt.Device(dict(serial='bench'), num_chan=num)
+            tx = ((np.random.normal(size=(num,nsamps)) + np.random.normal(size=(num,nsamps))*1j)*.1).astype(np.complex64)
+            for i in range(num): chan_em.write(tx[i], i, 0)
+            results.append(timeit(lambda: chan_em.read_many(nsamps, list(range(num)), 0)))
+        ratio = noiseStd('batched', num, nsamps, radius)/noiseStd('loop', num, nsamps, radius)
+        if abs(20*np.log10(ratio)) > .5: print("WARNING: the batched engine's noise is %.1f dB off the loop engine's" % (20*np.log10(ratio)))
+        print("%8d %14.2f %14.2f %9.1fx %12.3f" % (num, results[0]*1e3, results[1]*1e3, results[0]/results[1], ratio))
+
+def benchNoise(sizes):
+    '''Noise throughput: the legacy float64 np.random draws against SoapySDRVirt.Noise filling its complex64 scratch buffer.'''
+    print("%10s %16s %16s %10s" % ("samples", "legacy (Msps)", "Noise (Msps)", "speedup"))
+    noise = SoapySDRVirt.Noise(0)
+    for n in sizes:
+        out = np.zeros(n, dtype=np.complex64)
+        def legacy(): 
+            out[:] += np.random.normal(scale=.01, size=n) + np.random.normal(scale=.01, size=n)*1.j
+        results = [timeit(legacy), timeit(lambda: noise.add(out, .01))]
+        print("%10d %16.1f %16.1f %9.1fx" % (n, n/results[0]/1e6, n/results[1]/1e6, results[0]/results[1]))
+
+def benchRemote(mtus, nsamps, fmt=SoapySDRVirt.SOAPY_SDR_CS16):
+    '''RX streaming throughput of a local Device against SoapyVirtRemote over TCP and UDP, for several MTUs.'''
+    freshEmulator()
+    server = SoapyVirtRemote.Server(('127.0.0.1', 0)).start()
+    address = "%s:%d" % server.address
+    print("%6s %8s %14s %14s %12s" % ("prot", "mtu", "elems/packet", "Msps", "us/packet"))
+    buffs = [SoapySDRVirt.formatBuffer(fmt, nsamps)]
+    sdr = SoapySDRVirt.Device(dict(serial='bench'))
+    stream = sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, fmt, [0], {})
+    sdr.activateStream(stream)
+    t = timeit(lambda: sdr.readStream(stream, buffs, nsamps))
+    print("%6s %8s %14s %14.2f %12s" % ("local", "-", "-", nsamps/t/1e6, "-"))
+    for prot in ['tcp', 'udp']:
+        for mtu in mtus:
+            sdr = SoapyVirtRemote.Device(dict(remote=address, serial='bench'))
+            stream = sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, fmt, [0], {"remote:prot":prot, "remote:mtu":str(mtu)})
+            epp = sdr.getStreamMTU(stream)
+            sdr.activateStream(stream)
+            t = timeit(lambda: sdr.readStream(stream, buffs, nsamps))
+            print("%6s %8d %14d %14.2f %12.1f" % (prot, mtu, epp, nsamps/t/1e6, t/(nsamps/epp)*1e6))
+            sdr.closeStream(stream)
+            sdr.close()
+    server.close()
+
+def benchThreads(threads, radios, nsamps, duration=2.):
+    '''Stress ChanEmu with threads that each stream TX and RX on their own radios, and report the read throughput of every thread.'''
+    print("%8s %16s %16s %16s" % ("threads", "min (Msps)", "max (Msps)", "total (Msps)"))
+    for num in threads:
+        chan_em = freshEmulator(coupling_radius=4)
+        SoapySDRVirt.Device(dict(serial='bench'), num_chan=max(radios, num))
+        tx = ((np.random.normal(size=nsamps) + np.random.normal(size=nsamps)*1j)*.1).astype(np.complex64)
+        counts = [0]*num
+        start = threading.Barrier(num + 1)
+        def work(i):
+            mine = list(range(i, max(radios, num), num))
+            start.wait()
+            t = time.time()
+            tick = 0
+            while time.time() - t < duration:
+                for c in mine: chan_em.write(tx, c, tick)
+                chan_em.read_many(nsamps, mine, tick)
+                counts[i] += nsamps*len(mine)
+                tick += nsamps
+        workers = [threading.Thread(target=work, args=(i,)) for i in range(num)]
+        for w in workers: w.start()
+        start.wait()
+        for w in workers: w.join()
+        rates = [c/duration/1e6 for c in counts]
+        print("%8d %16.2f %16.2f %16.2f" % (num, min(rates), max(rates), sum(rates)))
+
+def benchDirect(sizes, radios=2):
+    '''RX throughput of readStream (copying into the caller's buffers) against acquireReadBuffer/releaseReadBuffer.  The channelization dominates both, so expect them within a few tens of percent.'''
+    print("%6s %8s %14s %14s %10s" % ("format", "samples", "copy (Msps)", "direct (Msps)", "speedup"))
+    for fmt in [SoapySDRVirt.SOAPY_SDR_CF32, SoapySDRVirt.SOAPY_SDR_CS16]:
+        for n in sizes:
+            freshEmulator(coupling_radius=1)
+            sdr = SoapySDRVirt.Device(dict(serial='bench'), num_chan=radios)
+            stream = sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, fmt, list(range(radios)), {"mtu":str(n)})
+            sdr.activateStream(stream)
+            buffs = [SoapySDRVirt.formatBuffer(fmt, n) for i in range(radios)]
+            def copy():
+                sr = sdr.readStream(stream, buffs, n)
+                buffs[0][:8].sum() #touch the samples, like a consumer would
+            def direct():
+                sr = sdr.acquireReadBuffer(stream)
+                sr.buffs[0][:8].sum()
+                sdr.releaseReadBuffer(stream, sr.handle)
+            results = [timeit(copy), timeit(direct)]
+            print("%6s %8d %14.2f %14.2f %9.2fx" % (fmt, n, n/results[0]/1e6, n/results[1]/1e6, results[0]/results[1]))
+
+def benchTrigger(sleeps, radios, nsamps, rate=5e6, frames=20):
+    '''
+    Frame rate of the MIMOGui trigger cycle (queue a WAIT_TRIGGER TX burst, arm the RX bursts, sleep, TRIGGER_GEN, sleep, read),
+    on the 'wall' timebase, for several sleeps (ms) before the trigger, without and with SYNC_DELAYS.  
+    skew is the spread (ticks) of the RX start times across radios.
+    '''
+    print("%8s %10s %14s %14s %10s" % ("sync", "sleep (ms)", "frames/s", "read (ms)", "skew"))
+    flags = SoapySDRVirt.SOAPY_SDR_WAIT_TRIGGER | SoapySDRVirt.SOAPY_SDR_END_BURST
+    for sync in [False, True]:
+        for sleep in sleeps:
+            chan_em = freshEmulator(coupling_radius=2)
+            sdrs = [SoapySDRVirt.Device(dict(serial='bench%d' % i)) for i in range(radios)]
+            for sdr in sdrs: sdr.setSampleRate(SoapySDRVirt.SOAPY_SDR_RX, 0, rate)
+            if sync: sdrs[0].writeSetting('SYNC_DELAYS', "")
+            for sdr in sdrs: sdr.setHardwareTime(0) #on the same tick (the 'samples' clock is stopped), so the RX times show the trigger delays
+            chan_em.set_timebase('wall')
+            tx_stream = sdrs[0].setupStream(SoapySDRVirt.SOAPY_SDR_TX, SoapySDRVirt.SOAPY_SDR_CF32, [0, 1], {})
+            rx_streams = [sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, SoapySDRVirt.SOAPY_SDR_CF32, [0, 1], {}) for sdr in sdrs[1:]]
+            tx = [((np.random.normal(size=nsamps) + np.random.normal(size=nsamps)*1j)*.1).astype(np.complex64)]*2
+            buffs = [np.zeros(nsamps, dtype=np.complex64) for i in range(2)]
+            t = time.time()
+            read_time = 0
+            for f in range(frames):
+                sdrs[0].writeStream(tx_stream, tx, nsamps, flags)
+                for sdr,stream in zip(sdrs[1:], rx_streams): sdr.activateStream(stream, flags, 0, nsamps)
+                time.sleep(sleep/1e3)
+                sdrs[0].writeSetting("TRIGGER_GEN", "")
+                time.sleep(sleep/2e3)
+                r = time.time()
+                starts = [sdr.readStream(stream, buffs, nsamps, timeoutUs=int(1e6)).timeNs for sdr,stream in zip(sdrs[1:], rx_streams)]
+                read_time += time.time() - r
+            skew = (max(starts) - min(starts))*rate/1e9
+            print("%8s %10g %14.1f %14.2f %10d" % (sync, sleep, frames/(time.time() - t), read_time/frames*1e3, skew))
+
+def benchDevices(counts):
+    '''Time to build an emulation of many devices, one Device(args) at a time against one Device([args, ...]) call.'''
+    print("%8s %16s %16s %10s" % ("devices", "one by one (ms)", "list (ms)", "speedup"))
+    for num in counts:
+        handles = [dict(driver='iris', serial='bench%d' % i) for i in range(num)]
+        results = []
+        for build in [lambda: [SoapySDRVirt.Device(h) for h in handles], lambda: SoapySDRVirt.Device(handles)]:
+            freshEmulator()
+            t = time.time()
+            build()
+            results.append(time.time() - t)
+        print("%8d %16.2f %16.2f %9.1fx" % (num, results[0]*1e3, results[1]*1e3, results[0]/results[1]))
+
+def benchCapture(sizes, reads=200):
+    '''RX throughput of a Device against a SoapyCapture.Recorder of it, then of a ReplayDevice of the capture (full speed).'''
+    print("%10s %14s %16s %14s %12s" % ("samples", "device (Msps)", "recorder (Msps)", "replay (Msps)", "file (MB)"))
+    path = os.path.join(tempfile.mkdtemp(), 'bench.cap')
+    for n in sizes:
+        freshEmulator(coupling_radius=1)
+        buffs = [np.zeros(n, dtype=np.complex64) for i in range(2)]
+        results = []
+        for sdr in [SoapySDRVirt.Device(dict(serial='bench')), SoapyCapture.Recorder(SoapySDRVirt.Device(dict(serial='bench')), path)]:
+            stream = sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, SoapySDRVirt.SOAPY_SDR_CF32, [0, 1], {})
+            sdr.activateStream(stream)
+            t = time.time()
+            for i in range(reads): sdr.readStream(stream, buffs, n)
+            results.append(time.time() - t)
+        sdr.close()
+        sdr = SoapyCapture.ReplayDevice(path)
+        stream = sdr.setupStream(SoapySDRVirt.SOAPY_SDR_RX, SoapySDRVirt.SOAPY_SDR_CF32, [0, 1], {})
+        t = time.time()
+        while sdr.readStream(stream, buffs, n).ret > 0: pass
+        results.append(time.time() - t)
+        print("%10d %14.2f %16.2f %14.2f %12.1f" % ((n,) + tuple(reads*n/r/1e6 for r in results) + (os.path.getsize(path)/1e6,)))
+    os.remove(path)
+
+def benchScenario(radios, radius=None, nsamps=1024):
+    '''Time to the first read of every radio, drawing all the channels against loading them from a saved scenario.'''
+    print("%8s %10s %14s %14s %12s" % ("radios", "channels", "draw (ms)", "load (ms)", "file (MB)"))
+    path = os.path.join(tempfile.mkdtemp(), 'bench.npz')
+    for num in radios:
+        handles = [dict(serial='bench%d' % i) for i in range(num)]
+        results = []
+        for load in [False, True]:
+            chan_em = freshEmulator(coupling_radius=radius, seed=0)
+            t = time.time()
+            if load: chan_em.load_scenario(path)
+            SoapySDRVirt.Device(handles, num_chan=1)
+            samps = chan_em.read_many(nsamps, list(range(num)), 0)
+            results.append(time.time() - t)
+            if not load: 
+                channels = len(chan_em._channels)
+                chan_em.save_scenario(path)
+        print("%8d %10d %14.1f %14.1f %12.1f" % (num, channels, results[0]*1e3, results[1]*1e3, os.path.getsize(path)/1e6))
+    os.remove(path)
+
+def benchReplay(radios, nsamps=4096, radius=None):
+    '''Read throughput with every other radio continuously replaying TX RAM (e.g., SISO_SDR.tx(continuous=True)), with and without the cached responses.'''
+    print("%8s %14s %14s" % ("radios", "uncached Msps", "cached Msps"))
+    for num in radios:
+        chan_em = freshEmulator(coupling_radius=radius, seed=0)
+        SoapySDRVirt.Device([dict(serial='bench%d' % i) for i in range(num)], num_chan=1)
+        for i in range(0, num, 2): chan_em.set_replay(i, (np.random.randn(SoapySDRVirt.ChanEmu.REPLAY_SIZE)*.1).astype(np.complex64))
+        results = []
+        for cache in [0, SoapySDRVirt.ChanEmu.REPLAY_CACHE_SIZE]:
+            chan_em.REPLAY_CACHE_SIZE = cache
+            tick = [0]
+            def read():
+                chan_em.read_many(nsamps, list(range(num)), tick[0])
+                tick[0] += nsamps
+            results.append(num*nsamps/timeit(read)/1e6)
+        del chan_em.REPLAY_CACHE_SIZE
+        print("%8d %14.2f %14.2f" % (num, results[0], results[1]))
+
+def benchGeometry(radios, nsamps=1024, nfft=64):
+    '''Time to get the full array response of a UPA (one user per 8 antennas) from an ArrayGeometry, and the first emulated read through it.'''
+    print("%8s %8s %16s %16s %16s" % ("antennas", "users", "paths (ms)", "freq resp (ms)", "first read (ms)"))
+    for num in radios:
+        users = max(num//8, 1)
+        rng = np.random.default_rng(0)
+        positions = np.concatenate([SoapySDRVirt.upa(max(num//8, 1), 8)[:num], rng.uniform(-200, 200, (users, 3)) + [300, 0, 0]])
+        geometry = SoapySDRVirt.ArrayGeometry(positions, num_scatterers=16, seed=0)
+        bs, ues = list(range(num)), list(range(num, num + users))
+        t_paths = timeit(lambda: geometry.paths(bs, ues, 10e6))
+        t_freq = timeit(lambda: geometry.frequency_response(bs, ues, 10e6, nfft))
+        chan_em = freshEmulator(geometry=geometry, rate=10e6, seed=0)
+        SoapySDRVirt.Device([dict(serial='bench%d' % i) for i in range(num + users)], num_chan=1)
+        t = time.time()
+        chan_em.read_many(nsamps, bs, 0)
+        print("%8d %8d %16.2f %16.2f %16.1f" % (num, users, t_paths*1e3, t_freq*1e3, (time.time() - t)*1e3))
+
+def benchLTS(nsamps, upsample):
+    '''Direct against FFT (overlap-save) correlation in lts.findLTS, to show the crossover that lts.correlate(method='auto') uses.'''
+    print("%8s %10s %14s %14s %8s" % ("us", "nsamps", "direct (us)", "fft (us)", "auto"))
+    for us in upsample:
+        for num in nsamps:
+            iq = (np.random.randn(num) + 1j*np.random.randn(num)).astype(np.complex64)
+            t_direct = timeit(lambda: lts.correlate(iq, us, 'direct'))
+            t_fft = timeit(lambda: lts.correlate(iq, us, 'fft'))
+            auto = 'fft' if num*64*us >= lts.FFT_MIN_WORK else 'direct'
+            print("%8d %10d %14.1f %14.1f %8s" % (us, num, t_direct*1e6, t_fft*1e6, auto))
+
+def benchLTSArray(antennas, nsamps):
+    '''findLTS, getCFO, and getChanEst on a whole (antennas x samples) capture at once, against one antenna at a time.'''
+    print("%8s %10s %14s %14s" % ("antennas", "nsamps", "batched (ms)", "per ant (ms)"))
+    gold = lts.genLTS()
+    for num in antennas:
+        for n in nsamps:
+            iq = ((np.random.randn(num, n) + 1j*np.random.randn(num, n))*.02).astype(np.complex64)
+            iq[:, 100:100+len(gold)] += gold*.5
+            def batched():
+                best, ltss, peaks = lts.findLTS(iq)
+                seg = iq[np.arange(num)[:, None], (best[:, None] % (n - 128)) + np.arange(128)]
+                return lts.getCFO(seg), lts.getChanEst(seg)
+            def loop():
+                out = []
+                for x in iq:
+                    best, ltss, peaks = lts.findLTS(x)
+                    seg = x[best % (n - 128):][:128]
+                    out.append((lts.getCFO(seg), lts.getChanEst(seg)))
+                return out
+            print("%8d %10d %14.2f %14.2f" % (num, n, timeit(batched)*1e3, timeit(loop)*1e3))
+
+def readTwoDevices(engine, seed, nsamps):
+    '''Two 2 channel devices reading the same window, one after the other, with bulk delays spread enough that the second often adds a longer channel.'''
+    chan_em = freshEmulator(engine=engine, seed=seed, channel_args=dict(attn=-20, cfo=0, delay_var=30, noise=None, dc=0))
+    SoapySDRVirt.Device([dict(serial='bench0'), dict(serial='bench1')], num_chan=2)
+    rng = np.random.default_rng(seed)
+    for i in range(4): chan_em.write((rng.standard_normal(3*nsamps)*.1).astype(np.complex64), i, 0)
+    return np.concatenate([chan_em.read_many(nsamps, [0, 1], 0), chan_em.read_many(nsamps, [2, 3], 0)])
+
+def checkSpectraCache(seeds=range(8), nsamps=1000):
+    '''The batched engine must not reuse TX spectra cached with a shorter overlap once a longer channel is added.'''
+    for seed in seeds:
+        loop, batched = readTwoDevices('loop', seed, nsamps), readTwoDevices('batched', seed, nsamps)
+        err = np.abs(batched - loop).max()*2048 #in LSBs of the 12 bit RX samples
+        if err > 1.5: return "seed %d is %.0f LSBs off the loop engine" % (seed, err)
+
+def checkScenarioGeometry(nsamps=1000):
+    '''Loading a scenario saved with an ArrayGeometry must restore it, so the same pairs are coupled and the reads match.'''
+    positions = np.concatenate([SoapySDRVirt.ula(3), SoapySDRVirt.ula(3) + [50, 0, 0]]) #two clusters, out of each other's coupling radius
+    path = os.path.join(tempfile.mkdtemp(), 'check.npz')
+    handles = [dict(serial='bench%d' % i) for i in range(len(positions))]
+    reads, coupled = [], []
+    for load in [False, True]:
+        chan_em = freshEmulator(coupling_radius=10, seed=0, geometry=None if load else SoapySDRVirt.ArrayGeometry(positions, seed=0))
+        if load: chan_em.load_scenario(path)
+        SoapySDRVirt.Device(handles, num_chan=1)
+        rng = np.random.default_rng(0)
+        for i in range(len(handles)): chan_em.write((rng.standard_normal(2*nsamps)*.1).astype(np.complex64), i, 0)
+        reads.append(chan_em.read_many(nsamps, list(range(len(handles))), 0))
+        coupled.append(sum(chan_em.channel(r, t) is not None for r in range(len(handles)) for t in range(len(handles))))
+        if not load: chan_em.save_scenario(path)
+    freshEmulator()
+    os.remove(path)
+    if coupled[0] != coupled[1]: return "%d coupled pairs after loading, instead of %d" % (coupled[1], coupled[0])
+    if not np.array_equal(reads[0], reads[1]): return "the loaded scenario reads differently"
+
+def runChecks(checks):
+    '''Run each check (returning None, or what went wrong), and return whether they all passed.'''
+    failed = 0
+    for check in checks:
+        try: err = check()
+        except Exception as e: err = repr(e)
+        print("%-24s %s" % (check.__name__, "ok" if err is None else "FAILED: " + err))
+        failed += err is not None
+    return failed == 0
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("bench", choices=["chanemu", "noise", "remote", "threads", "direct", "trigger", "devices", "capture", "scenario", "replay", "geometry", "lts", "ltsarray", "check"], help="Which benchmark to run (check runs the consistency checks instead)")
+    parser.add_argument("--radios", type=int, nargs='+', dest="radios", help="Numbers of emulated radios to try", default=[2, 4, 8, 16, 32, 64])
+    parser.add_argument("--nsamps", type=int, nargs='+', dest="nsamps", help="Samples per read (chanemu uses the first), or buffer sizes to try", default=None)
+    parser.add_argument("--mtus", type=int, nargs='+', dest="mtus", help="MTUs to try for remote streaming", default=[576, 1500, 4000, 9000])
+    parser.add_argument("--threads", type=int, nargs='+', dest="threads", help="Numbers of threads to try", default=[1, 2, 4, 8])
+    parser.add_argument("--sleeps", type=float, nargs='+', dest="sleeps", help="Sleeps (ms) before the trigger to try", default=[0, 1, 10, 100])
+    parser.add_argument("--upsample", type=int, nargs='+', dest="upsample", help="LTS upsample factors to try", default=[1, 2, 4, 8])
+    parser.add_argument("--radius", type=float, dest="radius", help="Optional ChanEmu coupling radius", default=None)
+    args = parser.parse_args()
+
+    if args.bench == "chanemu":
+        benchChanEmu(args.radios, args.nsamps[0] if args.nsamps else 4096, args.radius)
+    elif args.bench == "noise":
+        benchNoise(args.nsamps or [256, 4096, 65536, 1048576])
+    elif args.bench == "remote":
+        benchRemote(args.mtus, args.nsamps[0] if args.nsamps else 65536)
+    elif args.bench == "threads":
+        benchThreads(args.threads, max(args.radios), args.nsamps[0] if args.nsamps else 4096)
+    elif args.bench == "direct":
+        benchDirect(args.nsamps or [1024, 4096, 8192])
+    elif args.bench == "trigger":
+        benchTrigger(args.sleeps, max(min(args.radios), 3), args.nsamps[0] if args.nsamps else 4096)
+    elif args.bench == "devices":
+        benchDevices(args.radios)
+    elif args.bench == "capture":
+        benchCapture(args.nsamps or [1024, 8192, 65536])
+    elif args.bench == "scenario":
+        benchScenario(args.radios, args.radius)
+    elif args.bench == "replay":
+        benchReplay(args.radios, args.nsamps[0] if args.nsamps else 4096, args.radius)
+    elif args.bench == "geometry":
+        benchGeometry(args.radios, args.nsamps[0] if args.nsamps else 1024)
+    elif args.bench == "lts":
+        benchLTS(args.nsamps or [256, 1024, 4096, 16384, 65536], args.upsample)
+    elif args.bench == "ltsarray":
+        benchLTSArray(args.radios, args.nsamps or [2048, 8192])
+    elif args.bench == "check":
+        exit(0 if runChecks([checkSpectraCache, checkScenarioGeometry]) else 1)
@@ -12,47 +12,158 @@
 #	(c) 2016 info@skylarkwireless.com 
 
 import numpy as np
+import functools
 
 lts_freq = np.array([0,0,0,0,0,0,1,1,-1,-1,1,1,-1,1,-1,1,1,1,1,1,1,-1,-1,1,1,-1,1,-1,1,1,1,1,0,1,-1,-1,1,1,-1,1,-1,1,-1,-1,-1,-1,-1,1,1,-1,-1,1,-1,1,-1,1,1,1,1,0,0,0,0,0])
 
-def genLTS(upsample=1, cp=32):
-	'''Generate a time-domain 802.11 LTS with a cyclic prefix of "cp" (32) and upsampled by a factor of "up" (1).'''
+@functools.lru_cache(maxsize=None)
+def _genLTS(upsample, cp, dtype):
 	up_zeros = np.zeros(len(lts_freq)//2*(upsample-1))
 	lts_freq_up = np.concatenate((up_zeros,lts_freq,up_zeros))
 	signal = np.fft.ifft(np.fft.ifftshift(lts_freq_up))
 	signal = signal/np.absolute(signal).max()  #normalize
 	
 	#Now affix the cyclic prefix
-	signal = np.concatenate((signal[len(signal) - cp:], signal, signal))  #could use tile...
-
+	signal = np.concatenate((signal[len(signal) - cp:], signal, signal)).astype(dtype)  #could use tile...
+	signal.flags.writeable = False
 	return signal
 
+def genLTS(upsample=1, cp=32, dtype=np.complex128):
+	'''
+		Generate a time-domain 802.11 LTS with a cyclic prefix of "cp" (32) and upsampled by a factor of "up" (1).
+		Waveforms are cached, so this returns a read-only array (copy it to change it).
+	'''
+	return _genLTS(int(upsample), int(cp), np.dtype(dtype))
+
+@functools.lru_cache(maxsize=None)
+def _genLTSTxRam(upsample, cp, order):
+	signal = genLTS(upsample, cp)
+	arr_i = (np.real(signal) * 32767).astype(np.int16).view(np.uint16)
+	arr_q = (np.imag(signal) * 32767).astype(np.int16).view(np.uint16)
+	if order == 'IQ': packed = np.bitwise_or(arr_q, np.left_shift(arr_i.astype(np.uint32), 16))
+	else: packed = np.bitwise_or(arr_i, np.left_shift(arr_q.astype(np.uint32), 16))
+	packed.flags.writeable = False
+	return packed
+
+def genLTSTxRam(upsample=1, cp=32, order='IQ'):
+	'''genLTS() packed into uint32 words for TX_RAM_A/B (I in the upper 16 bits for "order" 'IQ', like cfloat2uint32), cached and read-only.'''
+	return _genLTSTxRam(int(upsample), int(cp), order)
+
+FFT_MIN_WORK = 1 << 18  #len(iq)*len(gold) (per antenna) from which FFT correlation is faster than direct (see benchmarks.py lts)
+
+def _gold(us):
+	'''The (read-only) LTS that findLTS correlates against.'''
+	return genLTS(upsample=us, cp=0)[:64*us]
+
+@functools.lru_cache(maxsize=None)
+def _goldSpectrum(us, nfft):
+	'''The (read-only) spectrum of the matched filter for _gold(us), in blocks of nfft.'''
+	spectrum = np.fft.fft(np.conj(_gold(us)[::-1]), nfft)
+	spectrum.flags.writeable = False
+	return spectrum
+
+def correlate(iq, us=1, method='auto'):
+	'''
+		Correlate "iq" with the LTS upsampled by "us", i.e., np.correlate(iq, gold, 'full'), along the last axis (e.g., antennas x samples).
+		"method" is 'direct', 'fft' (overlap-save against the cached spectrum of the LTS), or 'auto' (the faster one for this length).
+	'''
+	iq = np.asarray(iq)
+	gold = _gold(us)
+	if method == 'auto': method = 'fft' if iq.shape[-1]*len(gold) >= FFT_MIN_WORK else 'direct'
+	if method == 'direct':
+		if iq.ndim == 1: return np.correlate(iq, gold, 'full')
+		cored = np.empty(iq.shape[:-1] + (iq.shape[-1] + len(gold) - 1,), dtype=np.complex128)
+		for x, out in zip(iq.reshape(-1, iq.shape[-1]), cored.reshape(-1, cored.shape[-1])): out[:] = np.correlate(x, gold, 'full')
+		return cored
+	n, lead = len(gold), iq.shape[:-1]
+	nfft = max(1024, 8*n)  #fastest block size across upsample factors
+	step = nfft - n + 1
+	num = iq.shape[-1] + n - 1  #length of the 'full' output
+	x = np.zeros(lead + (-(-num // step)*step + n - 1,), dtype=np.complex128)  #numpy's double precision FFTs are the faster ones
+	x[..., n-1:n-1+iq.shape[-1]] = iq
+	blocks = np.lib.stride_tricks.sliding_window_view(x, nfft, axis=-1)[..., ::step, :]
+	cored = np.fft.ifft(np.fft.fft(blocks, axis=-1)*_goldSpectrum(us, nfft), axis=-1)[..., n-1:]  #all the antennas in one pass
+	return cored.reshape(lead + (-1,))[..., :num]
+
 def findLTS(iq, thresh=600, us=1):
 	'''
 		Find the indices of all LTSs in the input "iq" signal, upsampled by a factor of "up".
 		"thresh" (600) sets sensitivity.
+		"iq" can also be 2-D (antennas x samples), to search every antenna in one batched pass.
 		
-		Returns: best (highest LTS peak), actual_ltss (the list of all detected LTSs), and peaks (the correlated signal, multiplied by itself delayed by 1/2 an LTS)
+		Returns: best (highest LTS peak), actual_ltss (an index array of all detected LTSs), and peaks (the correlated signal, multiplied by itself delayed by 1/2 an LTS)
+		For 2-D "iq" these are per antenna: an array of bests, a list of index arrays, and 2-D peaks.
 	'''
-	
-	gold = genLTS(upsample=us, cp=0)[:64*us]
-	cored = np.correlate(iq,gold,'full')
-	peaks = np.concatenate((np.zeros(64*us),cored)) * np.concatenate((np.conj(cored),np.zeros(64*us)))
-	t = np.mean(np.abs(iq))*thresh
-	ltss = np.where(peaks > t)[0]
-	actual_ltss = []
-	for l in ltss:
-		if not peaks[l+us*64] > peaks[l]:  #if there is another peak 64 samples in the future, this was probably a false positive from the CP
-			actual_ltss.append(l - us*128) #return the start of the LTS, not the end.
-	best = np.argmax(peaks) - us*128
+	iq = np.asarray(iq)
+	cored = correlate(iq, us)
+	peaks = np.zeros(cored.shape[:-1] + (cored.shape[-1] + 64*us,), dtype=np.complex128)  #cored delayed by 1/2 an LTS...
+	peaks[..., 64*us:] = cored
+	peaks[..., :-64*us] *= np.conj(cored)  #...times cored (and zeros past its end), without temporaries the size of a 2-D capture
+	peaks[..., -64*us:] = 0
+	t = np.mean(np.abs(iq), axis=-1).reshape(-1)*thresh
+	rows = peaks.reshape(-1, peaks.shape[-1])
+	ant, ltss = np.nonzero(rows.real[:, :-us*64] >= t[:, None])  #complex values compare by the real part first, so only these can be above
+	above = rows[ant, ltss] > t[ant]
+	ant, ltss = ant[above], ltss[above]
+	later = rows[ant, ltss+us*64]  #if there is another peak 64 samples in the future, this was probably a false positive from the CP
+	qualified = ~(later > rows[ant, ltss])
+	ant, ltss = ant[qualified], ltss[qualified] - us*128  #return the start of the LTS, not the end.
+	actual_ltss = ltss if iq.ndim == 1 else np.split(ltss, np.cumsum(np.bincount(ant, minlength=len(rows)))[:-1])
+	best = np.argmax(peaks, axis=-1) - us*128
 	return best, actual_ltss, peaks
 
 def getChanEst(iq, us=1):
-	'''Takes an "iq" stream of 128*"us" length and computes the channel estimates.'''
-	iq = iq[::us] #downsample
-	return np.mean(np.fft.fftshift(np.fft.fft(np.reshape(iq, (2,64) ),axis=1),axes=(1)),axis=0)*lts_freq #multiply and divide are the same since they're all 1 or -1
+	'''Takes an "iq" stream of 128*"us" length (or antennas x 128*"us") and computes the channel estimates (of every antenna).'''
+	iq = np.asarray(iq)[..., ::us] #downsample
+	return np.mean(np.fft.fftshift(np.fft.fft(np.reshape(iq, iq.shape[:-1] + (2,64) ),axis=-1),axes=(-1)),axis=-2)*lts_freq #multiply and divide are the same since they're all 1 or -1
 
 def getCFO(iq,us=1):
-	'''Takes an "iq" stream of 128*"us" length and computes the CFO.'''
-	ltss = np.reshape(iq, (us*64,2) )
-	return np.mean(np.angle(ltss[:,0]*np.conj(ltss[:,1])))/64
\ No newline at end of file
+	'''Takes an "iq" stream of 128*"us" length (or antennas x 128*"us") and computes the CFO (of every antenna).'''
+	iq = np.asarray(iq)
+	ltss = np.reshape(iq, iq.shape[:-1] + (us*64,2) )
+	return np.mean(np.angle(ltss[...,0]*np.conj(ltss[...,1])), axis=-1)/64
+
+class LTSDetector:
+	'''
+		findLTS for continuous receive: feed() it consecutive chunks (of any length) and it returns the LTSs found so far,
+		as absolute sample indices (counting from the first sample fed).  The correlator tail and a running estimate of the
+		signal level (the mean |iq|, over roughly the last "memory" samples) carry across chunks, so LTSs straddling two reads 
+		are found too, and memory use stays bounded.  An LTS is reported once 64*"us" samples after its end have been fed.
+	'''
+	def __init__(self, thresh=600, us=1, memory=4096):
+		self.thresh = thresh
+		self.us = us
+		self.memory = memory
+		self.reset()
+	
+	def reset(self):
+		'''Start over, as if no samples had been fed.'''
+		d = 64*self.us
+		self.count = 0  #samples fed so far
+		self.level = None
+		self._hist = np.zeros(d - 1, dtype=np.complex64)  #last input samples, for the correlation
+		self._cored = np.zeros(d, dtype=np.complex128)  #last correlation values, for the peaks
+		self._peaks = np.zeros(d, dtype=np.complex128)  #last peaks, which need the next 64*us to qualify
+	
+	def feed(self, iq):
+		'''Process the next chunk of samples and return an index array of the (absolute) starts of the LTSs qualified in it.'''
+		iq = np.asarray(iq)
+		n, d = len(iq), 64*self.us
+		if n == 0: return np.zeros(0, dtype=np.int64)
+		x = np.concatenate((self._hist, iq))
+		cored = np.concatenate((self._cored, correlate(x, self.us)[d-1:d-1+n]))  #correlations ending at samples count-d..count+n-1
+		peaks = np.concatenate((self._peaks, cored[:n] * np.conj(cored[d:])))  #peaks for samples count-d..count+n-1, as in findLTS
+		w = max(n/(self.count + n), 1 - (1 - 1/self.memory)**n)  #weight of this chunk in the running level (the plain mean until "memory" samples)
+		level = np.mean(np.abs(iq))
+		self.level = level if self.level is None else (1 - w)*self.level + w*level
+		ltss = np.flatnonzero(peaks[:n] > self.level*self.thresh)
+		later = peaks[ltss+d]  #if there is another peak 64 samples in the future, this was probably a false positive from the CP
+		ltss = ltss[~(later > peaks[ltss])] + self.count - 3*d  #absolute start of the LTS, not the end
+		self._hist, self._cored, self._peaks = x[len(x)-d+1:], cored[n:], peaks[n:]
+		self.count += n
+		return ltss
+	
+	def stream(self, chunks):
+		'''Generator stage: for every chunk from "chunks" (e.g., successive readStream buffers), yield (chunk, LTS start indices).'''
+		for iq in chunks:
+			yield iq, self.feed(iq)